@@ -2,10 +2,22 @@ import urllib.parse
 import urllib.request
 import urllib.robotparser
 import urllib
-from bs4 import BeautifulSoup
 import json
+import os
+import sys
 import time
 
+sys.path.append(
+    os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+)
+
+from archive import ArchiveWriter, replay  # noqa: E402
+from common import instrumentation  # noqa: E402
+from extraction import (  # noqa: E402
+    decode_body, extract_from_chunks, get_page_type, read_chunks
+)
+from frontier import Frontier  # noqa: E402
+
 DELAY = 1.5
 
 
@@ -26,6 +38,57 @@ def is_allowed(user_agent: str, url: str) -> bool:
     return robot_parser.can_fetch(useragent=user_agent, url=url)
 
 
+def fetch_page(
+    url: str,
+    targets: tuple = None,
+    archive: ArchiveWriter = None
+) -> dict:
+    """
+    Downloads a page and extracts some fields while it is read.
+    The download stops as soon as all the fields are found, unless
+    the page is archived.
+
+    Args:
+        url (str): The URL of the document
+
+        targets (tuple): The fields to extract (by default the
+            ones of the type of the page, see extraction.PAGE_TYPES)
+
+        archive (ArchiveWriter): Where the raw response is written
+            (not written by default)
+
+    Returns:
+        dict: The extracted fields
+    """
+
+    with instrumentation.timer("tp1_fetch_seconds"):
+        response = urllib.request.urlopen(url=url)
+
+    with response:
+        if archive is not None:
+            # The whole page is needed to extract it again later
+            with instrumentation.timer("tp1_fetch_seconds"):
+                body = response.read()
+            with instrumentation.timer("tp1_archive_seconds"):
+                archive.write(
+                    url=url,
+                    status=response.status,
+                    headers=response.headers.items(),
+                    body=body
+                )
+            return extract_from_chunks(
+                url=url,
+                chunks=[decode_body(body, response.headers.get("Content-Type"))],
+                targets=targets
+            )
+
+        return extract_from_chunks(
+            url=url,
+            chunks=read_chunks(response),
+            targets=targets
+        )
+
+
 def extract_title(url: str) -> str:
     """
     Extracts the title of a document.
@@ -37,10 +100,7 @@ def extract_title(url: str) -> str:
         str: The title of the document
     """
 
-    request_url = urllib.request.urlopen(url=url)
-    soup = BeautifulSoup(request_url, 'html.parser')
-
-    return soup.title.get_text(strip=True)
+    return fetch_page(url=url, targets=("title",))["title"]
 
 
 def extract_links(url: str) -> list[str]:
@@ -54,17 +114,7 @@ def extract_links(url: str) -> list[str]:
         list[str]: All the links of the document
     """
 
-    links = []
-    request_url = urllib.request.urlopen(url=url)
-    soup = BeautifulSoup(request_url, 'html.parser')
-
-    links_extraction = soup.find_all('a', href=True)
-
-    for link in links_extraction:
-        href = urllib.parse.urljoin(url, link["href"])
-        links.append(href)
-
-    return links
+    return fetch_page(url=url, targets=("links",))["links"]
 
 
 def extract_first_paragraph(url: str):
@@ -78,17 +128,8 @@ def extract_first_paragraph(url: str):
         str: The first paragraph of the document
     """
 
-    # We retrieve the content of the page
-    request_url = urllib.request.urlopen(url=url)
-    soup = BeautifulSoup(request_url, 'html.parser')
-
     # We retrieve the first paragraph (first <p>)
-    first_paragraph = soup.find('p')
-
-    if first_paragraph:
-        return first_paragraph.get_text(strip=True)
-
-    return first_paragraph
+    return fetch_page(url=url, targets=("description",))["description"]
 
 
 # 3. Crawling logic
@@ -165,90 +206,200 @@ def get_queue(urls: list) -> list:
     return sorted(queue, key=queue.get, reverse=False)
 
 
-def extract_informations_from_url(url: str) -> dict:
+def extract_informations_from_url(
+    url: str,
+    archive: ArchiveWriter = None
+) -> dict:
     """
-    Extracts all the informations of a document.
+    Extracts all the informations of a document. The page is
+    downloaded once, and the features and reviews are only looked
+    for in product pages.
 
     Args:
         url (str): The URL of the document
 
+        archive (ArchiveWriter): Where the raw page is written (not
+            written by default)
+
     Returns:
         dict: {
             "url": str,
             "title": str,
             "description": str,
-            "links": list[str]
+            "product_features": dict,
+            "links": list[str],
+            "product_reviews": list[dict]
         }
     """
 
-    title = extract_title(url=url)
-    description = extract_first_paragraph(url=url)
-    links = extract_links(url=url)
+    with instrumentation.timer("tp1_extract_page_seconds"):
+        fields = fetch_page(url=url, archive=archive)
+
+    instrumentation.count("tp1_pages_total")
+    instrumentation.count(f"tp1_{get_page_type(url)}_pages_total")
+    instrumentation.count("tp1_links_found_total", len(fields["links"]))
+
+    return get_informations(url=url, fields=fields)
+
+
+def get_informations(url: str, fields: dict) -> dict:
 
     return {
         "url": url,
-        "title": title,
-        "description": description,
-        "links": links
+        "title": fields["title"],
+        "description": fields["description"],
+        "product_features": fields["product_features"],
+        "links": fields["links"],
+        "product_reviews": fields["product_reviews"]
     }
 
 
-def crawler(starting_url: str, max_pages: int = 50) -> list:
+def extract_informations_from_record(record: dict) -> dict:
+    """
+    Extracts all the informations of a document from its record
+    in the archive, as extract_informations_from_url does.
+
+    Args:
+        record (dict): The record (see archive.parse_record)
+
+    Returns:
+        dict: The informations of the document
+    """
+
+    content_type = dict(
+        (name.lower(), value) for name, value in record["headers"]
+    ).get("content-type")
+
+    fields = extract_from_chunks(
+        url=record["url"],
+        chunks=[decode_body(record["body"], content_type)]
+    )
+
+    return get_informations(url=record["url"], fields=fields)
+
+
+def reextract(path: str, workers: int = None):
+    """
+    Extracts again the pages of an archive, without crawling, with
+    the current version of the extraction (e.g. after a new field
+    was added).
 
-    result_crawler = []
+    Args:
+        path (str): The path of the archive
+
+        workers (int): The number of processes (by default the
+            number of CPUs)
 
-    # First we extract the content of the starting url
-    result_crawler.append(
-        extract_informations_from_url(url=starting_url)
+    Yields:
+        dict: The informations of each page, in the order of the crawl
+    """
+
+    yield from replay(
+        path=path, extract=extract_informations_from_record, workers=workers
     )
 
-    # We then extract and order the list of all url of the document
-    urls_to_visit = extract_links(starting_url)
-    urls_to_visit = get_queue(urls=urls_to_visit)
 
-    i = 1
+def crawl(
+    starting_url: str,
+    max_pages: int = 50,
+    frontier: Frontier = None,
+    archive: ArchiveWriter = None
+):
+    """
+    Crawls the pages from a starting URL, the product pages first.
+    The pages are given one by one, so that they can be written
+    without keeping the whole crawl in memory.
+
+    Args:
+        starting_url (str): The URL of the first page
+
+        max_pages (int): The number of pages to visit (including
+            the ones visited before a restart of the frontier)
+
+        frontier (Frontier): The URLs to visit (by default in
+            memory). A frontier stored in a file allows the crawl to
+            be larger than the memory and to be resumed.
 
-    while i < max_pages:
+        archive (ArchiveWriter): Where the raw pages are written, to
+            extract them again later with reextract (not written by
+            default)
+
+    Yields:
+        dict: The informations of each page
+    """
+
+    if frontier is None:
+        frontier = Frontier(priority=get_priority)
+
+    # Ignored if the crawl is resumed
+    frontier.add([starting_url])
+
+    first_page = True
+
+    while frontier.n_visited < max_pages:
+
+        url = frontier.pop()
+        if url is None:
+            break
 
         # Politeness to the servers
-        time.sleep(DELAY)
+        if not first_page:
+            with instrumentation.timer("tp1_politeness_seconds"):
+                time.sleep(DELAY)
+        first_page = False
 
-        url = urls_to_visit[0]
+        # We extract the informations
+        page = extract_informations_from_url(url=url, archive=archive)
 
-        # We make sure that we only extract different URLS
-        if url in [page["url"] for page in result_crawler]:
-            urls_to_visit.remove(url)
+        # The frontier ignores the URLS already seen
+        with instrumentation.timer("tp1_queue_seconds"):
+            n_new = frontier.add(page["links"])
 
-        else:
+        instrumentation.count(
+            "tp1_duplicate_urls_total", len(page["links"]) - n_new
+        )
+        instrumentation.set_gauge("tp1_queue_size", len(frontier))
 
-            # We extract the informations
-            result_crawler.append(
-                extract_informations_from_url(url=url)
-            )
+        yield page
+
+        # The page is only recorded as visited once it has been used
+        frontier.mark_visited(url)
 
-            # We update and order the list of all the URLS to visit
-            urls_to_visit = get_queue(
-                urls=urls_to_visit + extract_links(url=url)
-            )
 
-            i += 1
+def crawler(starting_url: str, max_pages: int = 50) -> list:
 
-    return result_crawler
+    return list(crawl(starting_url=starting_url, max_pages=max_pages))
 
 
-def save_result(result: list):
+def save_result(
+    result: list,
+    path: str = "TP1/products.jsonl",
+    append: bool = False
+):
     """
     Saves the index for the brands in a json file.
 
     Args:
         index_reviews (list): The origin index
+
+        path (str): The path of the jsonl file
+
+        append (bool): Whether the pages are added at the end of
+            the file (to resume a crawl)
     """
 
-    with open("TP1/products.jsonl", 'w') as file:
+    with open(path, 'a' if append else 'w') as file:
         for item in result:
             file.write(json.dumps(item, ensure_ascii=False) + "\n")
 
 
-save_result(
-    result=crawler("https://web-scraping.dev/product/13", max_pages=20)
-)
+if __name__ == "__main__":
+
+    save_result(
+        result=crawler("https://web-scraping.dev/product/13", max_pages=20)
+    )
+
+    # Run with METRICS=1 to get the time spent in each stage
+    if instrumentation.is_enabled():
+        instrumentation.save_json_report("TP1/metrics.json")
+        instrumentation.save_prometheus("TP1/metrics.prom")
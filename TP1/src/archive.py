@@ -0,0 +1,345 @@
+import datetime
+import gzip
+import json
+import os
+import zlib
+from concurrent.futures import ProcessPoolExecutor
+from itertools import repeat
+
+
+# Each record is a separate gzip member (as in .warc.gz files), so that
+# a record can be read from its offset without reading the others.
+
+# Size of the blocks read when the archive is scanned
+CHUNK_SIZE = 1024 ** 2
+
+
+def get_index_path(path: str) -> str:
+    return path + ".idx"
+
+
+def create_record(url: str, status: int, headers: list, body: bytes) -> bytes:
+    """
+    Creates a WARC-like record of an HTTP response.
+
+    Args:
+        url (str): The URL of the page
+
+        status (int): The HTTP status
+
+        headers (list): The (name, value) headers of the response
+
+        body (bytes): The content of the response
+
+    Returns:
+        bytes: The record, not compressed
+    """
+
+    http_block = (
+        f"HTTP/1.1 {status}\r\n"
+        + "".join(f"{name}: {value}\r\n" for name, value in headers)
+        + "\r\n"
+    ).encode("utf-8") + body
+
+    warc_header = (
+        "WARC/1.0\r\n"
+        "WARC-Type: response\r\n"
+        f"WARC-Target-URI: {url}\r\n"
+        f"WARC-Date: {datetime.datetime.now(datetime.timezone.utc).isoformat()}\r\n"
+        "Content-Type: application/http; msgtype=response\r\n"
+        f"Content-Length: {len(http_block)}\r\n"
+        "\r\n"
+    ).encode("utf-8")
+
+    return warc_header + http_block + b"\r\n\r\n"
+
+
+def parse_record(data: bytes) -> dict:
+    """
+    Reads a record created by create_record.
+
+    Args:
+        data (bytes): The record, not compressed
+
+    Returns:
+        dict: {
+            "url": str,
+            "date": str,
+            "status": int,
+            "headers": list[tuple[str, str]],
+            "body": bytes
+        }
+    """
+
+    warc_header, _, rest = data.partition(b"\r\n\r\n")
+    warc_fields = dict(
+        line.split(": ", 1)
+        for line in warc_header.decode("utf-8").split("\r\n")[1:]
+    )
+    http_block = rest[:int(warc_fields["Content-Length"])]
+
+    http_header, _, body = http_block.partition(b"\r\n\r\n")
+    status_line, *header_lines = http_header.decode("utf-8").split("\r\n")
+
+    return {
+        "url": warc_fields["WARC-Target-URI"],
+        "date": warc_fields["WARC-Date"],
+        "status": int(status_line.split()[1]),
+        "headers": [tuple(line.split(": ", 1)) for line in header_lines],
+        "body": body,
+    }
+
+
+class ArchiveWriter:
+    """
+    Appends the raw responses of the crawler to a compressed archive,
+    and the position of each record to an index (one json per line).
+    """
+
+    def __init__(self, path: str, compression_level: int = 6):
+        self.path = path
+        self.compression_level = compression_level
+
+        # After a crash, the records written after the last one indexed
+        # (the last one possibly incomplete) must be checked, otherwise
+        # the new records would be appended after a broken one
+        if os.path.exists(path) and get_indexed_end(path) != os.path.getsize(path):
+            rebuild_index(path)
+
+        self._file = open(path, "ab")
+        self._index = open(get_index_path(path), "a", encoding="utf-8")
+
+    def write(self, url: str, status: int, headers: list, body: bytes):
+        """
+        Appends a response to the archive.
+
+        Args:
+            url (str): The URL of the page
+
+            status (int): The HTTP status
+
+            headers (list): The (name, value) headers of the response
+
+            body (bytes): The content of the response
+        """
+
+        data = gzip.compress(
+            create_record(url, status, headers, body),
+            compresslevel=self.compression_level
+        )
+
+        offset = self._file.seek(0, os.SEEK_END)
+        self._file.write(data)
+        self._file.flush()
+
+        # The index is written after the record, so that it never
+        # points to a record which is not complete
+        self._index.write(json.dumps(
+            {"url": url, "offset": offset, "length": len(data)}
+        ) + "\n")
+        self._index.flush()
+
+    def close(self):
+        self._file.close()
+        self._index.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+def read_index(path: str, latest_only: bool = True) -> list[dict]:
+    """
+    Reads the index of an archive.
+
+    Args:
+        path (str): The path of the archive
+
+        latest_only (bool): Whether only the last response of each
+            URL is kept
+
+    Returns:
+        list[dict]: The {"url", "offset", "length"} of each record,
+            in the order of the archive
+    """
+
+    with open(get_index_path(path), "r", encoding="utf-8") as f:
+        entries = [json.loads(line) for line in f if line.strip()]
+
+    if latest_only:
+        latest = {entry["url"]: entry for entry in entries}
+        entries = sorted(latest.values(), key=lambda entry: entry["offset"])
+
+    return entries
+
+
+def get_indexed_end(path: str) -> int:
+    """
+    Gives the end of the last record of the index of an archive,
+    reading only the end of the index.
+
+    Args:
+        path (str): The path of the archive
+
+    Returns:
+        int: The position in the archive (-1 if the end of the index
+            is not readable)
+    """
+
+    index_path = get_index_path(path)
+    if not os.path.exists(index_path):
+        return 0
+
+    with open(index_path, "rb") as f:
+        size = f.seek(0, os.SEEK_END)
+        if size == 0:
+            return 0
+
+        f.seek(max(0, size - 4096))
+        tail = f.read()
+
+    if not tail.endswith(b"\n"):
+        # The last entry is incomplete
+        return -1
+
+    try:
+        entry = json.loads(tail.splitlines()[-1])
+    except ValueError:
+        return -1
+
+    return entry["offset"] + entry["length"]
+
+
+def scan_records(path: str):
+    """
+    Reads the records of an archive one after the other, with a
+    bounded buffer, until its end or the first incomplete record.
+
+    Args:
+        path (str): The path of the archive
+
+    Yields:
+        tuple[int, int, bytes]: The offset, the compressed length and
+            the content of each complete record
+    """
+
+    with open(path, "rb") as f:
+        offset = 0
+        data = b""
+
+        while True:
+            decompressor = zlib.decompressobj(wbits=31)
+            record = []
+            length = 0
+
+            while not decompressor.eof:
+                if not data:
+                    data = f.read(CHUNK_SIZE)
+                    if not data:
+                        # End of the archive, or incomplete record
+                        return
+
+                try:
+                    record.append(decompressor.decompress(data))
+                except zlib.error:
+                    return
+
+                # What follows the end of the record belongs to the next one
+                length += len(data) - len(decompressor.unused_data)
+                data = decompressor.unused_data
+
+            yield offset, length, b"".join(record)
+            offset += length
+
+
+def rebuild_index(path: str) -> int:
+    """
+    Rebuilds the index of an archive by reading all its records,
+    e.g. after the crawler was stopped while writing. The incomplete
+    record at the end, if any, is removed from the archive.
+
+    Args:
+        path (str): The path of the archive
+
+    Returns:
+        int: The number of records
+    """
+
+    entries = []
+    end = 0
+
+    for offset, length, record in scan_records(path):
+        entries.append({
+            "url": parse_record(record)["url"],
+            "offset": offset,
+            "length": length
+        })
+        end = offset + length
+
+    if os.path.getsize(path) > end:
+        os.truncate(path, end)
+
+    with open(get_index_path(path), "w", encoding="utf-8") as f:
+        for entry in entries:
+            f.write(json.dumps(entry) + "\n")
+
+    return len(entries)
+
+
+def read_records(path: str, entries: list[dict]):
+    """
+    Reads some records of an archive from their position.
+
+    Args:
+        path (str): The path of the archive
+
+        entries (list[dict]): The entries of the index
+
+    Yields:
+        dict: The records (see parse_record)
+    """
+
+    with open(path, "rb") as f:
+        for entry in entries:
+            f.seek(entry["offset"])
+            yield parse_record(gzip.decompress(f.read(entry["length"])))
+
+
+def _extract_batch(path: str, entries: list[dict], extract) -> list:
+    return [extract(record) for record in read_records(path, entries)]
+
+
+def replay(path: str, extract, workers: int = None, batch_size: int = 64):
+    """
+    Gives the records of an archive to an extraction function, in
+    parallel processes, to extract pages again without crawling.
+
+    Args:
+        path (str): The path of the archive
+
+        extract (callable): Gives the result of a record; it must be
+            defined at the top level of a module
+
+        workers (int): The number of processes (by default the
+            number of CPUs)
+
+        batch_size (int): The number of records given at once to a
+            process
+
+    Yields:
+        The results, in the order of the archive
+    """
+
+    entries = read_index(path)
+    batches = [
+        entries[start:start + batch_size]
+        for start in range(0, len(entries), batch_size)
+    ]
+
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        for results in executor.map(
+            _extract_batch, repeat(path), batches, repeat(extract)
+        ):
+            yield from results
@@ -0,0 +1,280 @@
+import codecs
+import email.message
+import json
+import os
+import re
+import sys
+import urllib.parse
+from html.parser import HTMLParser
+
+sys.path.append(
+    os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+)
+
+from common import instrumentation  # noqa: E402
+
+
+# The fields extracted for each type of page. The links are only
+# complete at the end of the document, so these pages are always parsed
+# until the end: the parsing only stops early for targets without links
+# (e.g. the title alone).
+PAGE_TYPES = {
+    "product": (
+        "title", "description", "links", "product_features", "product_reviews"
+    ),
+    "other": ("title", "description", "links"),
+}
+
+CHUNK_SIZE = 16384
+
+
+def get_page_type(url: str) -> str:
+    """
+    Tells the type of a page from its URL.
+
+    Args:
+        url (str): The URL
+
+    Returns:
+        str: "product" for a product page, "other" otherwise
+    """
+
+    path = urllib.parse.urlparse(url).path
+
+    return "product" if re.search(r"/product/\d+", path) else "other"
+
+
+class StopParsing(Exception):
+    """
+    Raised when all the targeted fields have been found.
+    """
+
+
+class PageExtractor(HTMLParser):
+    """
+    Extracts some fields of a page while it is parsed, without
+    building the tree of the document:
+        - title: the text of the first <title>
+        - description: the text of the first <p>
+        - links: the absolute URL of every <a href>
+        - product_features: the rows of the features table
+          (<td class="feature-label"> / <td class="feature-value">)
+        - product_reviews: the json of <script id="reviews-data">
+    """
+
+    def __init__(self, url: str, targets: tuple):
+        super().__init__(convert_charrefs=True)
+
+        self.url = url
+        self.pending = set(targets)
+        self.fields = {
+            "title": None,
+            "description": None,
+            "links": [],
+            "product_features": {},
+            "product_reviews": [],
+        }
+
+        # The field whose text is being read, its tag and the text read
+        self._capture = None
+        self._capture_tag = None
+        self._texts = []
+        self._depth = 0
+        self._feature_label = None
+
+    def _start_capture(self, name: str):
+        self._capture = name
+        self._texts = []
+        self._depth = 0
+
+    def _end_capture(self, strip_pieces: bool = True) -> str:
+        # As BeautifulSoup's get_text(strip=True): each piece of text
+        # is stripped, then they are joined
+        if strip_pieces:
+            text = "".join(piece.strip() for piece in self._texts)
+        else:
+            text = "".join(self._texts)
+
+        self._capture = None
+        self._texts = []
+
+        return text
+
+    def _done(self, field: str):
+        self.pending.discard(field)
+
+        if not self.pending:
+            raise StopParsing
+
+    def handle_starttag(self, tag: str, attrs: list):
+
+        if self._capture is not None:
+            if tag == self._capture_tag:
+                self._depth += 1
+            if tag == "a" and "links" in self.pending:
+                self._add_link(attrs)
+            return
+
+        if tag == "title" and "title" in self.pending:
+            self._capture_tag = "title"
+            self._start_capture("title")
+
+        elif tag == "p" and "description" in self.pending:
+            self._capture_tag = "p"
+            self._start_capture("description")
+
+        elif tag == "a" and "links" in self.pending:
+            self._add_link(attrs)
+
+        elif tag == "td" and "product_features" in self.pending:
+            classes = (dict(attrs).get("class") or "").split()
+            if "feature-label" in classes:
+                self._capture_tag = "td"
+                self._start_capture("feature-label")
+            elif "feature-value" in classes and self._feature_label:
+                self._capture_tag = "td"
+                self._start_capture("feature-value")
+
+        elif tag == "script" and "product_reviews" in self.pending:
+            if dict(attrs).get("id") == "reviews-data":
+                self._capture_tag = "script"
+                self._start_capture("reviews")
+
+    def handle_endtag(self, tag: str):
+
+        if tag == "table" and self.fields["product_features"]:
+            self._done("product_features")
+
+        if self._capture is None or tag != self._capture_tag:
+            return
+
+        if self._depth:
+            self._depth -= 1
+            return
+
+        capture = self._capture
+
+        if capture == "title":
+            self.fields["title"] = self._end_capture()
+            self._done("title")
+
+        elif capture == "description":
+            self.fields["description"] = self._end_capture()
+            self._done("description")
+
+        elif capture == "feature-label":
+            self._feature_label = self._end_capture().lower()
+
+        elif capture == "feature-value":
+            value = self._end_capture()
+            self.fields["product_features"][self._feature_label] = value
+            self._feature_label = None
+
+        elif capture == "reviews":
+            text = self._end_capture(strip_pieces=False)
+            try:
+                self.fields["product_reviews"] = json.loads(text)
+            except ValueError:
+                pass
+            self._done("product_reviews")
+
+    def handle_data(self, data: str):
+        if self._capture is not None:
+            self._texts.append(data)
+
+    def _add_link(self, attrs: list):
+        href = dict(attrs).get("href")
+
+        if href is not None:
+            self.fields["links"].append(urllib.parse.urljoin(self.url, href))
+
+    def close(self):
+        try:
+            super().close()
+        except StopParsing:
+            pass
+
+
+def extract_from_chunks(url: str, chunks, targets: tuple = None) -> dict:
+    """
+    Extracts the targeted fields of a page given piece by piece. The
+    following pieces are not read once all the fields are found, which
+    never happens when the links are targeted.
+
+    Args:
+        url (str): The URL of the page
+
+        chunks (iterable[str]): The HTML of the page
+
+        targets (tuple): The fields to extract (by default the ones
+            of the type of the page)
+
+    Returns:
+        dict: The extracted fields
+    """
+
+    extractor = PageExtractor(
+        url=url,
+        targets=targets or PAGE_TYPES[get_page_type(url)]
+    )
+
+    try:
+        for chunk in chunks:
+            with instrumentation.timer("tp1_parse_seconds"):
+                extractor.feed(chunk)
+        extractor.close()
+    except StopParsing:
+        instrumentation.count("tp1_early_stops_total")
+
+    return extractor.fields
+
+
+def decode_body(body: bytes, content_type: str = None) -> str:
+    """
+    Decodes the content of a page with the charset of its
+    Content-Type header (utf-8 by default).
+
+    Args:
+        body (bytes): The content of the page
+
+        content_type (str): The Content-Type header
+
+    Returns:
+        str: The HTML of the page
+    """
+
+    message = email.message.Message()
+    if content_type:
+        message["Content-Type"] = content_type
+    charset = message.get_content_charset() or "utf-8"
+
+    try:
+        return body.decode(charset, errors="replace")
+    except LookupError:
+        return body.decode("utf-8", errors="replace")
+
+
+def read_chunks(response, chunk_size: int = CHUNK_SIZE):
+    """
+    Reads and decodes an HTTP response piece by piece.
+
+    Args:
+        response: The response given by urllib.request.urlopen
+
+        chunk_size (int): The number of bytes read at once
+
+    Yields:
+        str: The decoded pieces
+    """
+
+    charset = response.headers.get_content_charset() or "utf-8"
+    decoder = codecs.getincrementaldecoder(charset)(errors="replace")
+
+    while True:
+        with instrumentation.timer("tp1_fetch_seconds"):
+            data = response.read(chunk_size)
+        if not data:
+            break
+        yield decoder.decode(data)
+
+    yield decoder.decode(b"", final=True)
@@ -0,0 +1,234 @@
+import bisect
+import hashlib
+import math
+import sqlite3
+
+
+# States of a URL in the frontier
+PENDING = 0
+BUFFERED = 1
+VISITED = 2
+
+
+class BloomFilter:
+    """
+    A fixed-size set of strings which may give false positives
+    (with a probability close to false_positive_rate) but never
+    false negatives.
+    """
+
+    def __init__(self, capacity: int, false_positive_rate: float = 0.001):
+        self.size = max(8, int(
+            -capacity * math.log(false_positive_rate) / math.log(2) ** 2
+        ))
+        self.n_hashes = max(1, round(self.size / capacity * math.log(2)))
+        self.bits = bytearray((self.size + 7) // 8)
+
+    def _get_positions(self, value: str):
+        digest = hashlib.blake2b(value.encode("utf-8"), digest_size=16).digest()
+        first = int.from_bytes(digest[:8], "little")
+        second = int.from_bytes(digest[8:], "little") | 1
+
+        # Double hashing gives the k positions from two hashes
+        for i in range(self.n_hashes):
+            yield (first + i * second) % self.size
+
+    def add(self, value: str):
+        for position in self._get_positions(value):
+            self.bits[position >> 3] |= 1 << (position & 7)
+
+    def __contains__(self, value: str) -> bool:
+        return all(
+            self.bits[position >> 3] & (1 << (position & 7))
+            for position in self._get_positions(value)
+        )
+
+
+class Frontier:
+    """
+    The URLs to visit, stored in a SQLite database so that the
+    crawl can be larger than the memory and survive a restart.
+
+    Only the buffer_size best URLs are kept in memory, the other
+    ones are spilled to the database. A Bloom filter remembers the
+    URLs already seen, so that the database is only queried for the
+    URLs it believes seen (to rule out its false positives).
+    """
+
+    def __init__(
+        self,
+        path: str = ":memory:",
+        priority=None,
+        buffer_size: int = 1000,
+        capacity: int = 1_000_000,
+        false_positive_rate: float = 0.001
+    ):
+        """
+        Args:
+            path (str): The path of the database (":memory:" for a
+                crawl which does not need to be resumed)
+
+            priority (callable): Gives the priority of a URL (the
+                lowest first), 0 for all of them by default
+
+            buffer_size (int): The number of URLs kept in memory
+
+            capacity (int): The expected number of distinct URLs
+
+            false_positive_rate (float): The probability of querying
+                the database for a new URL because the Bloom filter
+                believes it seen
+        """
+
+        self.priority = priority or (lambda url: 0)
+        self.buffer_size = buffer_size
+        self.seen = BloomFilter(capacity, false_positive_rate)
+
+        self._connection = sqlite3.connect(path)
+        self._connection.execute(
+            "CREATE TABLE IF NOT EXISTS frontier ("
+            " sequence INTEGER PRIMARY KEY AUTOINCREMENT,"
+            " url TEXT UNIQUE NOT NULL,"
+            " priority INTEGER NOT NULL,"
+            " state INTEGER NOT NULL)"
+        )
+        self._connection.execute(
+            "CREATE INDEX IF NOT EXISTS pending"
+            " ON frontier (state, priority, sequence)"
+        )
+
+        # After a restart, the URLs which were in memory are pending again
+        self._connection.execute(
+            "UPDATE frontier SET state = ? WHERE state = ?",
+            (PENDING, BUFFERED)
+        )
+        self._connection.commit()
+
+        for (url,) in self._connection.execute("SELECT url FROM frontier"):
+            self.seen.add(url)
+
+        self.n_visited = self._count(VISITED)
+        self._n_spilled = self._count(PENDING)
+
+        # Sorted list of (priority, sequence, url)
+        self._buffer = []
+
+    def _count(self, state: int) -> int:
+        return self._connection.execute(
+            "SELECT COUNT(*) FROM frontier WHERE state = ?", (state,)
+        ).fetchone()[0]
+
+    def _contains(self, url: str) -> bool:
+        # Lookup in the unique index of the URLs
+        return self._connection.execute(
+            "SELECT 1 FROM frontier WHERE url = ?", (url,)
+        ).fetchone() is not None
+
+    def __len__(self) -> int:
+        return len(self._buffer) + self._n_spilled
+
+    def close(self):
+        self._connection.commit()
+        self._connection.close()
+
+    def add(self, urls: list[str]) -> int:
+        """
+        Adds URLs to visit. The URLs already seen are ignored.
+
+        Args:
+            urls (list[str]): The URLs
+
+        Returns:
+            int: The number of new URLs
+        """
+
+        n_new = 0
+
+        for url in urls:
+            if url in self.seen and self._contains(url):
+                continue
+            self.seen.add(url)
+            n_new += 1
+
+            priority = self.priority(url)
+            sequence = self._connection.execute(
+                "INSERT OR IGNORE INTO frontier (url, priority, state)"
+                " VALUES (?, ?, ?)",
+                (url, priority, PENDING)
+            ).lastrowid
+            entry = (priority, sequence, url)
+
+            # The buffer always holds the best pending URLs
+            if self._n_spilled == 0 and len(self._buffer) < self.buffer_size:
+                self._move_to_buffer(entry)
+
+            elif self._buffer and entry < self._buffer[-1]:
+                self._move_to_buffer(entry)
+                self._spill(self._buffer.pop())
+
+            else:
+                self._n_spilled += 1
+
+        self._connection.commit()
+
+        return n_new
+
+    def _move_to_buffer(self, entry: tuple):
+        bisect.insort(self._buffer, entry)
+        self._connection.execute(
+            "UPDATE frontier SET state = ? WHERE sequence = ?",
+            (BUFFERED, entry[1])
+        )
+
+    def _spill(self, entry: tuple):
+        self._n_spilled += 1
+        self._connection.execute(
+            "UPDATE frontier SET state = ? WHERE sequence = ?",
+            (PENDING, entry[1])
+        )
+
+    def _refill(self):
+        entries = self._connection.execute(
+            "SELECT priority, sequence, url FROM frontier WHERE state = ?"
+            " ORDER BY priority, sequence LIMIT ?",
+            (PENDING, self.buffer_size)
+        ).fetchall()
+
+        self._connection.executemany(
+            "UPDATE frontier SET state = ? WHERE sequence = ?",
+            [(BUFFERED, sequence) for _, sequence, _ in entries]
+        )
+        self._n_spilled -= len(entries)
+        self._buffer = entries
+
+    def pop(self) -> str | None:
+        """
+        Gives the next URL to visit. It is visited again after a
+        restart unless mark_visited is called.
+
+        Returns:
+            str | None: The URL, None if there is nothing left to visit
+        """
+
+        if not self._buffer and self._n_spilled:
+            self._refill()
+
+        if not self._buffer:
+            return None
+
+        return self._buffer.pop(0)[2]
+
+    def mark_visited(self, url: str):
+        """
+        Records that a URL has been visited and its page saved.
+
+        Args:
+            url (str): The URL
+        """
+
+        self._connection.execute(
+            "UPDATE frontier SET state = ? WHERE url = ?",
+            (VISITED, url)
+        )
+        self._connection.commit()
+        self.n_visited += 1
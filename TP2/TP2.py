@@ -1,13 +1,33 @@
 import json
+import os
 import re
+import sys
+import numpy as np
 import spacy
+from scipy import sparse
 from urllib.parse import urlparse, parse_qs
 from collections import defaultdict
 
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from common import instrumentation  # noqa: E402
+from common.autocomplete import (  # noqa: E402
+    create_autocomplete, get_term_scores, save_autocomplete
+)
+from common.ann import create_ann_index, normalize, save_ann_index  # noqa: E402
+from common.fuzzy import create_fuzzy_index  # noqa: E402
+from common.review_stats import ReviewStats  # noqa: E402
+from common.term_dictionary import (  # noqa: E402
+    create_term_dictionary, save_term_dictionary
+)
+
 # 1. Reading and processing the URL
 
 path = "TP2/input/products.jsonl"
 
+# The reviews received after the crawl, one json per line
+review_log_path = "TP2/input/reviews.jsonl"
+
 
 def read_jsonl(path: str) -> list[dict]:
     """
@@ -30,9 +50,6 @@ def read_jsonl(path: str) -> list[dict]:
     return input
 
 
-doc_products = read_jsonl(path=path)
-
-
 def extract_product_info(url: str) -> dict:
     """
     Extracts the product ID and variant from a product URL.
@@ -107,6 +124,7 @@ def get_position_from_tokens(tokens: list) -> list[tuple]:
     ]
 
 
+@instrumentation.timed("tp2_create_inverted_index_for_title_seconds")
 def create_inverted_index_for_title(documents: list) -> dict:
     """
     Creates an inverted index for the title of each document.
@@ -123,30 +141,39 @@ def create_inverted_index_for_title(documents: list) -> dict:
     for document in documents:
         url = document["url"]
         titre = document["title"]
-        tokens = create_token(titre)
-        mots_positions = get_position_from_tokens(tokens)
 
-        for mot, position in mots_positions:
-            index[mot][url].append(position)
+        with instrumentation.timer("tp2_tokenize_seconds"):
+            tokens = create_token(titre)
+
+        with instrumentation.timer("tp2_insert_seconds"):
+            mots_positions = get_position_from_tokens(tokens)
+
+            for mot, position in mots_positions:
+                index[mot][url].append(position)
+
+        instrumentation.count("tp2_title_tokens_total", len(tokens))
 
     return index
 
 
-def save_index_title(index_title: dict):
+def save_index_title(
+    index_title: dict,
+    path: str = "TP2/title_index.json"
+):
     """
     Saves the index for the title in a json file.
 
     Args:
         index_title (list): The title index
+
+        path (str): The path of the json file
     """
 
-    with open("TP2/title_index.json", 'w') as file:
+    with open(path, 'w') as file:
         json.dump(index_title, file, indent=4)
 
 
-save_index_title(index_title=create_inverted_index_for_title(doc_products))
-
-
+@instrumentation.timed("tp2_create_inverted_index_for_description_seconds")
 def create_inverted_index_for_description(documents: dict) -> dict:
     """
     Creates an inverted index for the description of each document.
@@ -163,128 +190,127 @@ def create_inverted_index_for_description(documents: dict) -> dict:
     for document in documents:
         url = document["url"]
         description = document["description"]
-        tokens = create_token(description)
-        mots_positions = get_position_from_tokens(tokens)
 
-        for mot, position in mots_positions:
-            index[mot][url].append(position)
+        with instrumentation.timer("tp2_tokenize_seconds"):
+            tokens = create_token(description)
+
+        with instrumentation.timer("tp2_insert_seconds"):
+            mots_positions = get_position_from_tokens(tokens)
+
+            for mot, position in mots_positions:
+                index[mot][url].append(position)
+
+        instrumentation.count("tp2_description_tokens_total", len(tokens))
 
     return index
 
 
-def save_index_description(index_description: dict):
+def save_index_description(
+    index_description: dict,
+    path: str = "TP2/description_index.json"
+):
     """
     Saves the index for the description in a json file.
 
     Args:
         index_title (list): The description index
+
+        path (str): The path of the json file
     """
 
-    with open("TP2/description_index.json", 'w') as file:
+    with open(path, 'w') as file:
         json.dump(index_description, file, indent=4)
 
 
-save_index_description(
-    index_description=create_inverted_index_for_description(doc_products)
-)
-
-
 # 3. Index of reviews
 
 
-def get_average_rating_reviews(reviews: list) -> float:
+def create_review_stats(documents: list) -> ReviewStats:
     """
-    Compute the average rate of reviews.
+    Aggregates the reviews of the crawled documents, review by
+    review, so that the reviews received later are added without
+    reading the previous ones again.
 
     Args:
-        reviews (list): All the reviews
+        documents (list): All the documents
 
     Returns:
-        float: The average rating
-    """
-
-    total_reviews = len(reviews)
-
-    total_rating = 0
-
-    for feedback in reviews:
-        total_rating += feedback["rating"]
-
-    return total_rating / total_reviews
-
-
-def extract_ratings_from_reviews(reviews: dict) -> dict:
+        ReviewStats: The aggregates of each document
     """
-    Extracts the total number of reviews, the
-    average and the last rating from a givens
-    set of reviews.
 
-    Args:
-        reviews (str): All the reviews
+    review_stats = ReviewStats()
 
-    Returns:
-        dict: {
-            "total_reviews": int,
-            "average_rating": int,
-            "last_rating": int
-        }
-    """
-
-    total_reviews = len(reviews)
-    if total_reviews == 0:
-        return {"total_reviews": 0, "average_rating": 0, "last_rating": None}
+    # A page crawled twice holds the same reviews: the last crawl is kept
+    documents = {document["url"]: document for document in documents}
 
-    average_rating = get_average_rating_reviews(reviews=reviews)
+    for document in documents.values():
+        url = document["url"]
+        review_stats.get_slot(url)
 
-    last_rating = reviews[-1]["rating"]
+        for feedback in document["product_reviews"]:
+            review_stats.add(url, feedback["rating"], feedback.get("date"))
 
-    return {
-        "total_reviews": total_reviews,
-        "average_rating": average_rating,
-        "last_rating": last_rating
-    }
+    return review_stats
 
 
-def create_index_reviews(reviews: dict):
+@instrumentation.timed("tp2_create_index_reviews_seconds")
+def create_index_reviews(documents: list, review_stats: ReviewStats = None):
     """
     Creates an index for the reviews of each document.
 
     Args:
         documents (list): All the documents
 
+        review_stats (ReviewStats): The aggregates of the reviews,
+            if they are already known (see create_review_stats)
+
     Returns:
         dict: The index associated with the reviews
     """
 
-    all_index = {}
+    if review_stats is None:
+        review_stats = create_review_stats(documents=documents)
 
-    for i in range(len(reviews)):
+    return review_stats.to_index()
 
-        url = reviews[i]["url"]
-        all_index[url] = extract_ratings_from_reviews(
-            reviews=reviews[i]["product_reviews"]
-        )
 
-    return all_index
-
-
-def save_index_reviews(index_reviews: dict):
+def save_index_reviews(
+    index_reviews: dict,
+    path: str = "TP2/reviews_index.json"
+):
     """
     Saves the index for the reviews in a json file.
 
     Args:
         index_reviews (list): The reviews index
+
+        path (str): The path of the json file
     """
 
-    with open("TP2/reviews_index.json", 'w') as file:
+    with open(path, 'w') as file:
         json.dump(index_reviews, file, indent=4)
 
 
-save_index_reviews(index_reviews=create_index_reviews(doc_products))
+def save_review_stats(
+    review_stats: ReviewStats,
+    path: str = "TP2/review_stats.npz"
+):
+    """
+    Saves the aggregates of the reviews, with the position reached
+    in the review log, so that TP3 updates them with the next reviews.
+
+    Args:
+        review_stats (ReviewStats): The aggregates
+
+        path (str): The path of the npz file
+    """
+
+    review_stats.save(path)
 
 
 # 4. Index of features
 
+@instrumentation.timed("tp2_create_index_origin_seconds")
 def create_index_origin(documents: list) -> dict:
     """
     Creates an index for the origin of each document.
@@ -307,21 +333,24 @@ def create_index_origin(documents: list) -> dict:
     return index_origin
 
 
-def save_index_origin(index_origin: dict):
+def save_index_origin(
+    index_origin: dict,
+    path: str = "TP2/origin_index.json"
+):
     """
     Saves the index for the reviews in a json file.
 
     Args:
         index_reviews (list): The origin index
+
+        path (str): The path of the json file
     """
 
-    with open("TP2/origin_index.json", 'w') as file:
+    with open(path, 'w') as file:
         json.dump(index_origin, file, indent=4)
 
 
-save_index_origin(index_origin=create_index_origin(doc_products))
-
-
+@instrumentation.timed("tp2_create_index_brand_seconds")
 def create_index_brand(documents: list) -> dict:
     """
     Creates an index for the brands of each document.
@@ -344,16 +373,419 @@ def create_index_brand(documents: list) -> dict:
     return index_brand
 
 
-def save_index_brand(index_brand: dict):
+def save_index_brand(
+    index_brand: dict,
+    path: str = "TP2/brand_index.json"
+):
     """
     Saves the index for the brands in a json file.
 
     Args:
         index_reviews (list): The origin index
+
+        path (str): The path of the json file
     """
 
-    with open("TP2/brand_index.json", 'w') as file:
+    with open(path, 'w') as file:
         json.dump(index_brand, file, indent=4)
 
 
-save_index_brand(index_brand=create_index_brand(doc_products))
+# 5. Index for typo-tolerant search
+
+@instrumentation.timed("tp2_create_index_fuzzy_seconds")
+def create_index_fuzzy(indexes: list[dict]) -> dict:
+    """
+    Creates the deletion index of all the terms of the given
+    indexes. It gives the terms close to a misspelled word
+    (up to 2 typos) without scanning all the terms.
+
+    Args:
+        indexes (list[dict]): The indexes (title, description...)
+
+    Returns:
+        dict: The deletion index
+    """
+
+    terms = set()
+
+    for index in indexes:
+        terms.update(index.keys())
+
+    return create_fuzzy_index(terms=terms, max_distance=2)
+
+
+def save_index_fuzzy(
+    index_fuzzy: dict,
+    path: str = "TP2/fuzzy_index.json"
+):
+    """
+    Saves the deletion index in a json file.
+
+    Args:
+        index_fuzzy (dict): The deletion index
+
+        path (str): The path of the json file
+    """
+
+    with open(path, 'w') as file:
+        json.dump(index_fuzzy, file)
+
+
+# 6. Autocomplete of the titles
+
+@instrumentation.timed("tp2_create_index_autocomplete_seconds")
+def create_index_autocomplete(
+    index_title: dict,
+    index_reviews: dict,
+    top_n: int = 10
+) -> bytes:
+    """
+    Creates the autocomplete structure of the title terms. Each
+    prefix is associated with its top_n completions, ranked by
+    the number of documents and their reviews.
+
+    Args:
+        index_title (dict): The title index
+
+        index_reviews (dict): The reviews index
+
+        top_n (int): The number of completions for each prefix
+
+    Returns:
+        bytes: The structure, to be memory-mapped by the searcher
+    """
+
+    return create_autocomplete(
+        term_scores=get_term_scores(index_title, index_reviews),
+        top_n=top_n
+    )
+
+
+def save_index_autocomplete(
+    index_autocomplete: bytes,
+    path: str = "TP2/autocomplete.bin"
+):
+    """
+    Saves the autocomplete structure in a binary file.
+
+    Args:
+        index_autocomplete (bytes): The autocomplete structure
+
+        path (str): The path of the file
+    """
+
+    save_autocomplete(content=index_autocomplete, path=path)
+
+
+# 7. Static rank from the links (PageRank)
+
+def merge_crawls(documents: list, delta_documents: list) -> list:
+    """
+    Updates a crawl with the pages of a new (delta) crawl.
+
+    Args:
+        documents (list): The documents of the previous crawl
+
+        delta_documents (list): The new or re-crawled documents
+
+    Returns:
+        list: The documents, the new version replacing the old one
+    """
+
+    merged = {document["url"]: document for document in documents}
+
+    for document in delta_documents:
+        merged[document["url"]] = document
+
+    return list(merged.values())
+
+
+def create_link_graph(documents: list) -> tuple[list, sparse.csr_matrix]:
+    """
+    Creates the adjacency matrix of the links between the crawled
+    documents (links to pages which were not crawled are ignored).
+
+    Args:
+        documents (list): All the documents
+
+    Returns:
+        tuple[list, sparse.csr_matrix]: The URL of each row and the
+            matrix (1 if the row links to the column)
+    """
+
+    urls = list(dict.fromkeys(document["url"] for document in documents))
+    doc_ids = {url: doc_id for doc_id, url in enumerate(urls)}
+
+    rows, columns = [], []
+
+    for document in documents:
+        source = doc_ids[document["url"]]
+        targets = {
+            doc_ids[link] for link in document.get("links", [])
+            if link in doc_ids and link != document["url"]
+        }
+        rows.extend([source] * len(targets))
+        columns.extend(targets)
+
+    graph = sparse.csr_matrix(
+        (np.ones(len(rows), dtype=np.float64), (rows, columns)),
+        shape=(len(urls), len(urls))
+    )
+    # A link appearing twice in a page counts once
+    graph.data[:] = 1
+
+    return urls, graph
+
+
+def compute_pagerank(
+    graph: sparse.csr_matrix,
+    damping: float = 0.85,
+    tolerance: float = 1e-9,
+    max_iterations: int = 100,
+    initial_rank: np.ndarray = None
+) -> tuple[np.ndarray, int]:
+    """
+    Computes the PageRank of each document by power iteration.
+
+    Args:
+        graph (sparse.csr_matrix): The adjacency matrix
+
+        damping (float): The probability of following a link
+
+        tolerance (float): The L1 variation under which we stop
+
+        max_iterations (int): The maximum number of iterations
+
+        initial_rank (np.ndarray): The starting point (uniform by
+            default), e.g. the rank before a delta crawl
+
+    Returns:
+        tuple[np.ndarray, int]: The ranks (summing to 1) and the
+            number of iterations
+    """
+
+    n_docs = graph.shape[0]
+    if n_docs == 0:
+        return np.zeros(0), 0
+
+    out_degree = np.asarray(graph.sum(axis=1)).ravel()
+    dangling = out_degree == 0
+
+    inverse_degree = np.zeros(n_docs)
+    inverse_degree[~dangling] = 1 / out_degree[~dangling]
+    transition = (sparse.diags(inverse_degree) @ graph).T.tocsr()
+
+    if initial_rank is None:
+        rank = np.full(n_docs, 1 / n_docs)
+    else:
+        rank = initial_rank / initial_rank.sum()
+
+    iteration = 0
+    for iteration in range(1, max_iterations + 1):
+        # The documents without links jump to any document
+        new_rank = damping * (transition @ rank + rank[dangling].sum() / n_docs)
+        new_rank += (1 - damping) / n_docs
+
+        variation = np.abs(new_rank - rank).sum()
+        rank = new_rank
+
+        if variation < tolerance:
+            break
+
+    return rank, iteration
+
+
+@instrumentation.timed("tp2_create_index_pagerank_seconds")
+def create_index_pagerank(documents: list, previous_index: dict = None) -> dict:
+    """
+    Creates the PageRank index of the documents. After a delta
+    crawl, the previous index is used as a starting point so that
+    only a few iterations are needed.
+
+    Args:
+        documents (list): All the documents (see merge_crawls)
+
+        previous_index (dict): The PageRank index of the previous crawl
+
+    Returns:
+        dict: The PageRank of each URL
+    """
+
+    urls, graph = create_link_graph(documents)
+
+    initial_rank = None
+    if previous_index:
+        # The new documents start with the average rank
+        initial_rank = np.array(
+            [previous_index.get(url, 1 / len(urls)) for url in urls]
+        )
+
+    rank, iterations = compute_pagerank(graph, initial_rank=initial_rank)
+    instrumentation.set_gauge("tp2_pagerank_iterations", iterations)
+
+    return {url: float(score) for url, score in zip(urls, rank)}
+
+
+def save_index_pagerank(
+    index_pagerank: dict,
+    path: str = "TP2/pagerank_index.json"
+):
+    """
+    Saves the PageRank index in a json file.
+
+    Args:
+        index_pagerank (dict): The PageRank index
+
+        path (str): The path of the json file
+    """
+
+    with open(path, 'w') as file:
+        json.dump(index_pagerank, file, indent=4)
+
+
+# 8. Vectors for semantic search
+
+@instrumentation.timed("tp2_create_index_vectors_seconds")
+def create_index_vectors(documents: list) -> dict:
+    """
+    Creates the approximate nearest neighbour (IVF) index of the
+    documents, represented by the mean of the word vectors of
+    en_core_web_md over their title and description.
+
+    Args:
+        documents (list): All the documents
+
+    Returns:
+        dict: The IVF index (see common.ann)
+    """
+
+    urls = [document["url"] for document in documents]
+
+    # Only the tokenizer is needed to get the word vectors
+    vectors = normalize(np.array([
+        nlp.make_doc(
+            f"{document['title']} {document['description'] or ''}".lower()
+        ).vector
+        for document in documents
+    ]))
+
+    return create_ann_index(urls=urls, vectors=vectors)
+
+
+def save_index_vectors(
+    index_vectors: dict,
+    path: str = "TP2/vector_index.npz"
+):
+    """
+    Saves the IVF index in a npz file.
+
+    Args:
+        index_vectors (dict): The IVF index
+
+        path (str): The path of the npz file
+    """
+
+    save_ann_index(ann_index=index_vectors, path=path)
+
+
+# 9. Dictionary of the terms
+
+
+@instrumentation.timed("tp2_create_index_terms_seconds")
+def create_index_terms(
+    index_title: dict,
+    index_description: dict,
+    index_brand: dict,
+    index_origin: dict
+) -> bytes:
+    """
+    Creates the dictionary of the terms of all the fields, in which
+    a term has the same ID whatever its field, stored with front
+    coding (much smaller than the keys of the indexes).
+
+    Args:
+        index_title (dict): The inverted index of the titles
+
+        index_description (dict): The inverted index of the descriptions
+
+        index_brand (dict): The index of the brands
+
+        index_origin (dict): The index of the origins
+
+    Returns:
+        bytes: The term dictionary
+    """
+
+    return create_term_dictionary({
+        "title": index_title,
+        "description": index_description,
+        "brand": index_brand,
+        "origin": index_origin,
+    })
+
+
+def save_index_terms(
+    index_terms: bytes,
+    path: str = "TP2/term_dictionary.bin"
+):
+    """
+    Saves the term dictionary in a binary file.
+
+    Args:
+        index_terms (bytes): The term dictionary
+
+        path (str): The path of the binary file
+    """
+
+    save_term_dictionary(content=index_terms, path=path)
+
+
+if __name__ == "__main__":
+
+    with instrumentation.timer("tp2_read_seconds"):
+        doc_products = read_jsonl(path=path)
+
+    index_title = create_inverted_index_for_title(doc_products)
+    save_index_title(index_title=index_title)
+
+    index_description = create_inverted_index_for_description(doc_products)
+    save_index_description(index_description=index_description)
+
+    review_stats = create_review_stats(doc_products)
+    if os.path.exists(review_log_path):
+        review_stats.update_from_log(review_log_path)
+
+    index_reviews = create_index_reviews(doc_products, review_stats=review_stats)
+    save_index_reviews(index_reviews=index_reviews)
+    save_review_stats(review_stats=review_stats)
+
+    index_origin = create_index_origin(doc_products)
+    save_index_origin(index_origin=index_origin)
+
+    index_brand = create_index_brand(doc_products)
+    save_index_brand(index_brand=index_brand)
+
+    save_index_fuzzy(
+        index_fuzzy=create_index_fuzzy(
+            [index_title, index_description, index_origin, index_brand]
+        )
+    )
+
+    save_index_autocomplete(
+        index_autocomplete=create_index_autocomplete(index_title, index_reviews)
+    )
+
+    save_index_pagerank(index_pagerank=create_index_pagerank(doc_products))
+
+    save_index_vectors(index_vectors=create_index_vectors(doc_products))
+
+    save_index_terms(
+        index_terms=create_index_terms(
+            index_title, index_description, index_brand, index_origin
+        )
+    )
+
+    # Run with METRICS=1 to get the time spent in each stage
+    if instrumentation.is_enabled():
+        instrumentation.save_json_report("TP2/metrics.json")
+        instrumentation.save_prometheus("TP2/metrics.prom")
@@ -1,8 +1,21 @@
 import json
+import os
+import numpy as np
 import spacy
+import sys
 import unicodedata
 import re
 
+from impact import ImpactIndex
+from facets import parse_filter
+from searcher import IndexSnapshot, Searcher
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from common import instrumentation  # noqa: E402
+from common.ann import normalize, search_ann_index  # noqa: E402
+from common.fuzzy import expand_tokens  # noqa: E402
+
 
 def import_index(path: str):
     """
@@ -21,14 +34,6 @@ def import_index(path: str):
     return index
 
 
-brand_index = import_index(path="TP3/input/brand_index.json")
-description_index = import_index(path="TP3/input/description_index.json")
-origin_index = import_index(path="TP3/input/origin_index.json")
-origin_synonyms = import_index(path="TP3/input/origin_synonyms.json")
-reviews_index = import_index(path="TP3/input/reviews_index.json")
-title_index = import_index(path="TP3/input/title_index.json")
-
-
 nlp = spacy.load("en_core_web_md")
 
 
@@ -44,6 +49,23 @@ def create_token(query: str):
     return tokens
 
 
+def is_ignored_term(token: str) -> bool:
+    """
+    Tells if a word is removed by the tokenizer of TP2 (stop word or
+    punctuation), so that it is in none of the indexes.
+
+    Args:
+        token (str): The word
+
+    Returns:
+        bool: True if the word is never indexed
+    """
+
+    lexeme = nlp.vocab[token]
+
+    return lexeme.is_stop or lexeme.is_punct
+
+
 def normalize_query(query: str) -> list[str]:
     """
     Normalize a given query (removes special
@@ -65,7 +87,11 @@ def normalize_query(query: str) -> list[str]:
     return query.split(" ")
 
 
-def find_token_in_brand_index(tokens: list, url: str) -> list[bool]:
+def find_token_in_brand_index(
+    tokens: list,
+    url: str,
+    snapshot: IndexSnapshot
+) -> list[bool]:
     """
     For each word, this function tells if it is in the
     brand of the document.
@@ -75,25 +101,33 @@ def find_token_in_brand_index(tokens: list, url: str) -> list[bool]:
 
         url (str): The url of the document
 
+        snapshot (IndexSnapshot): The indexes used for the query
+
     Returns:
         list[bool]: List of bool
     """
 
+    terms = snapshot.terms
+    doc_id = snapshot.doc_ids[url]
     presence_token = []
 
     for token in tokens:
-        if token in brand_index.keys():
-
-            if url in brand_index[token]:
-                presence_token.append(True)
+        term_id = terms.get_id(token)
+        if term_id is not None and terms.has_field(term_id, "brand"):
 
-            else:
-                presence_token.append(False)
+            # Membership is tested in the bitmap instead of the list
+            presence_token.append(
+                snapshot.facets.contains("brand", token, doc_id)
+            )
 
     return presence_token
 
 
-def find_token_in_description_index(tokens: list, url: str) -> list[bool]:
+def find_token_in_description_index(
+    tokens: list,
+    url: str,
+    snapshot: IndexSnapshot
+) -> list[bool]:
     """
     For each word, this function tells if it is in the
     description of the document.
@@ -103,25 +137,32 @@ def find_token_in_description_index(tokens: list, url: str) -> list[bool]:
 
         url (str): The url of the document
 
+        snapshot (IndexSnapshot): The indexes used for the query
+
     Returns:
         list[bool]: List of bool
     """
 
+    terms = snapshot.terms
+    doc_id = snapshot.doc_ids[url]
     presence_token = []
 
     for token in tokens:
-        if token in description_index.keys():
+        term_id = terms.get_id(token)
+        if term_id is not None and terms.has_field(term_id, "description"):
 
-            if url in description_index[token]:
-                presence_token.append(True)
-
-            else:
-                presence_token.append(False)
+            presence_token.append(
+                snapshot.postings.contains("description", term_id, doc_id)
+            )
 
     return presence_token
 
 
-def find_token_in_origin_index(tokens: list, url: str) -> list[bool]:
+def find_token_in_origin_index(
+    tokens: list,
+    url: str,
+    snapshot: IndexSnapshot
+) -> list[bool]:
     """
     For each word, this function tells if it is in the
     origin of the document.
@@ -131,25 +172,33 @@ def find_token_in_origin_index(tokens: list, url: str) -> list[bool]:
 
         url (str): The url of the document
 
+        snapshot (IndexSnapshot): The indexes used for the query
+
     Returns:
         list[bool]: List of bool
     """
 
+    terms = snapshot.terms
+    doc_id = snapshot.doc_ids[url]
     presence_token = []
 
     for token in tokens:
-        if token in origin_index.keys():
+        term_id = terms.get_id(token)
+        if term_id is not None and terms.has_field(term_id, "origin"):
 
-            if url in origin_index[token]:
-                presence_token.append(True)
-
-            else:
-                presence_token.append(False)
+            # Membership is tested in the bitmap instead of the list
+            presence_token.append(
+                snapshot.facets.contains("origin", token, doc_id)
+            )
 
     return presence_token
 
 
-def find_token_in_title_index(tokens: list, url: str) -> list[bool]:
+def find_token_in_title_index(
+    tokens: list,
+    url: str,
+    snapshot: IndexSnapshot
+) -> list[bool]:
     """
     For each word, this function tells if it is in the
     title of the document.
@@ -159,34 +208,43 @@ def find_token_in_title_index(tokens: list, url: str) -> list[bool]:
 
         url (str): The url of the document
 
+        snapshot (IndexSnapshot): The indexes used for the query
+
     Returns:
         list[bool]: List of bool
     """
 
+    terms = snapshot.terms
+    doc_id = snapshot.doc_ids[url]
     presence_token = []
 
     for token in tokens:
-        if token in brand_index.keys():
-
-            if url in brand_index[token]:
-                presence_token.append(True)
+        term_id = terms.get_id(token)
+        if term_id is not None and terms.has_field(term_id, "title"):
 
-            else:
-                presence_token.append(False)
+            presence_token.append(
+                snapshot.postings.contains("title", term_id, doc_id)
+            )
 
     return presence_token
 
 
 # 3. Ranking
 
+# The weight of the presence of a word in each field
+FIELD_WEIGHTS = {
+    "brand": 3,
+    "description": 4,
+    "origin": 3.5,
+    "title": 6,
+}
 
-documents = []
-with open("TP3/rearranged_products.jsonl", "r", encoding="utf-8") as f:
-    for line in f:
-        documents.append(json.loads(line))
 
-
-def get_score_presence_brand(tokens: list, url: str):
+def get_score_presence_brand(
+    tokens: list,
+    url: str,
+    snapshot: IndexSnapshot
+):
     """
     This function computes the score associated with
     the presence of each token in the brand of a given
@@ -197,21 +255,28 @@ def get_score_presence_brand(tokens: list, url: str):
 
         url (str): The url of the document
 
+        snapshot (IndexSnapshot): The indexes used for the query
+
     Returns:
         int: The score
     """
 
-    brand_weight = 3
+    brand_weight = FIELD_WEIGHTS["brand"]
 
     presence_brand = find_token_in_brand_index(
         tokens=tokens,
-        url=url
+        url=url,
+        snapshot=snapshot
     )
 
     return brand_weight*sum(presence_brand)
 
 
-def get_score_presence_description(tokens: list, url: str):
+def get_score_presence_description(
+    tokens: list,
+    url: str,
+    snapshot: IndexSnapshot
+):
     """
     This function computes the score associated with
     the presence of each token in the description of
@@ -222,21 +287,28 @@ def get_score_presence_description(tokens: list, url: str):
 
         url (str): The url of the document
 
+        snapshot (IndexSnapshot): The indexes used for the query
+
     Returns:
         int: The score
     """
 
-    description_weight = 4
+    description_weight = FIELD_WEIGHTS["description"]
 
     presence_description = find_token_in_description_index(
         tokens=tokens,
-        url=url
+        url=url,
+        snapshot=snapshot
     )
 
     return description_weight*sum(presence_description)
 
 
-def get_score_presence_origin(tokens: list, url: str):
+def get_score_presence_origin(
+    tokens: list,
+    url: str,
+    snapshot: IndexSnapshot
+):
     """
     This function computes the score associated with
     the presence of each token in the origin country
@@ -247,21 +319,28 @@ def get_score_presence_origin(tokens: list, url: str):
 
         url (str): The url of the document
 
+        snapshot (IndexSnapshot): The indexes used for the query
+
     Returns:
         int: The score
     """
 
-    origin_weight = 3.5
+    origin_weight = FIELD_WEIGHTS["origin"]
 
     presence_origin = find_token_in_origin_index(
         tokens=tokens,
-        url=url
+        url=url,
+        snapshot=snapshot
     )
 
     return origin_weight*sum(presence_origin)
 
 
-def get_score_presence_title(tokens: list, url: str):
+def get_score_presence_title(
+    tokens: list,
+    url: str,
+    snapshot: IndexSnapshot
+):
     """
     This function computes the score associated with
     the presence of each token in the title of
@@ -272,15 +351,18 @@ def get_score_presence_title(tokens: list, url: str):
 
         url (str): The url of the document
 
+        snapshot (IndexSnapshot): The indexes used for the query
+
     Returns:
         int: The score
     """
 
-    title_weight = 6
+    title_weight = FIELD_WEIGHTS["title"]
 
     presence_title = find_token_in_title_index(
         tokens=tokens,
-        url=url
+        url=url,
+        snapshot=snapshot
     )
 
     if all(x == True for x in presence_title):
@@ -289,48 +371,109 @@ def get_score_presence_title(tokens: list, url: str):
     return title_weight*sum(presence_title)
 
 
-def get_score_rewiews(url: str):
+def get_score_static(
+    url: str,
+    snapshot: IndexSnapshot,
+    static_scores: np.ndarray = None
+):
     """
-    This function computes the score associated with
-    the marks of a given document.
+    This function gives the score of a given document which
+    does not depend on the query (marks and PageRank), computed
+    when the indexes are loaded.
 
     Args:
         url (str): The url of the document
 
+        snapshot (IndexSnapshot): The indexes used for the query
+
+        static_scores (np.ndarray): The static scores read at the
+            start of the query (the current ones by default)
+
     Returns:
-        int: The score
+        float: The score
+    """
+
+    if static_scores is None:
+        static_scores = snapshot.static_scores
+
+    return float(static_scores[snapshot.doc_ids[url]])
+
+
+def get_query_expansions(
+    query: str,
+    snapshot: IndexSnapshot,
+    penalties: dict = None
+) -> list[tuple[str, float]]:
     """
+    Finds the terms of the indexes close to the words of the query
+    which are in none of them (up to 2 typos, 1 for short words).
+    The stop words, which TP2 does not index, are not corrected.
 
-    review = reviews_index[url]
+    Args:
+        query (str): The query
 
-    return review["mean_mark"] + review["last_rating"]
+        snapshot (IndexSnapshot): The indexes used for the query
 
+        penalties (dict): The score factor for each number of typos
+            (by default 0.5 for 1 typo and 0.25 for 2)
 
-def get_score_presence_all(query: str, url: str):
+    Returns:
+        list[tuple[str, float]]: The (term, score factor) pairs
+    """
+
+    if snapshot.fuzzy_index is None:
+        return []
+
+    # A single lookup in the term dictionary tells if a word is in
+    # one of the indexes
+    return expand_tokens(
+        tokens=normalize_query(query=query),
+        fuzzy_index=snapshot.fuzzy_index,
+        known_terms=lambda token: token in snapshot.terms,
+        penalties=penalties,
+        ignored_terms=is_ignored_term
+    )
+
+
+def get_score_presence_all(
+    query: str,
+    url: str,
+    snapshot: IndexSnapshot,
+    expansions: list = None,
+    static_scores: np.ndarray = None
+):
 
     tokens = normalize_query(query=query)
 
     score_brand = get_score_presence_brand(
         tokens=tokens,
-        url=url
+        url=url,
+        snapshot=snapshot
     )
 
     score_description = get_score_presence_description(
         tokens=tokens,
-        url=url
+        url=url,
+        snapshot=snapshot
     )
 
     score_origin = get_score_presence_origin(
         tokens=tokens,
-        url=url
+        url=url,
+        snapshot=snapshot
     )
 
     score_title = get_score_presence_title(
         tokens=tokens,
-        url=url
+        url=url,
+        snapshot=snapshot
     )
 
-    score_reviews = get_score_rewiews(url=url)
+    score_static = get_score_static(
+        url=url,
+        snapshot=snapshot,
+        static_scores=static_scores
+    )
 
     # We compute the score associated
 
@@ -339,25 +482,376 @@ def get_score_presence_all(query: str, url: str):
         score_description +
         score_origin +
         score_title +
-        score_reviews
+        score_static
     )
 
+    # Terms found with typos count less than the words of the query
+    for term, penalty in expansions or []:
+        score += penalty * (
+            get_score_presence_brand([term], url, snapshot) +
+            get_score_presence_description([term], url, snapshot) +
+            get_score_presence_origin([term], url, snapshot) +
+            get_score_presence_title([term], url, snapshot)
+        )
+
     return score
 
 
-def get_score_for_all_url(query: str, documents: list):
+def filter_documents(
+    documents: list,
+    snapshot: IndexSnapshot,
+    filters: str
+) -> list:
+    """
+    Keeps the documents matching facet filters, such as
+    "origin=usa AND brand=chocodelight".
+
+    Args:
+        documents (list): All the documents
+
+        snapshot (IndexSnapshot): The indexes used for the query
+
+        filters (str): The filters (see facets.parse_filter)
+
+    Returns:
+        list: The documents matching the filters
+    """
+
+    include, exclude = parse_filter(filters)
+    matching = snapshot.facets.filter(include=include, exclude=exclude)
+
+    return [
+        document for document in documents
+        if snapshot.doc_ids.get(document["url"], -1) in matching
+    ]
+
+
+def get_score_for_all_url(
+    query: str,
+    documents: list,
+    snapshot: IndexSnapshot,
+    filters: str = None,
+    fuzzy_penalties: dict = None
+):
+
+    # The facet filters are applied before ranking
+    if filters:
+        documents = filter_documents(
+            documents=documents,
+            snapshot=snapshot,
+            filters=filters
+        )
+
+    # The typos are corrected once for all the documents
+    with instrumentation.timer("tp3_fuzzy_seconds"):
+        expansions = get_query_expansions(
+            query=query,
+            snapshot=snapshot,
+            penalties=fuzzy_penalties
+        )
+
+    # New reviews give new static scores: all the documents are scored
+    # with the ones of the start of the query
+    static_scores = snapshot.static_scores
 
     scores = {}
 
-    for document in documents:
-        scores[document["url"]] = get_score_presence_all(
+    with instrumentation.timer("tp3_score_seconds"):
+        for document in documents:
+            scores[document["url"]] = get_score_presence_all(
+                query=query,
+                url=document["url"],
+                snapshot=snapshot,
+                expansions=expansions,
+                static_scores=static_scores
+            )
+
+    instrumentation.count("tp3_queries_total")
+    instrumentation.count("tp3_documents_scored_total", len(documents))
+
+    return scores
+
+
+def get_query_clauses(
+    query: str,
+    snapshot: IndexSnapshot,
+    expansions: list = None,
+    impact_index: ImpactIndex = None
+) -> tuple[list, list, float]:
+    """
+    Translates the score of get_score_presence_all into postings
+    of the impact index: each (word, field) pair adds the weight of
+    the field to the documents containing the word, and the title
+    bonus is given to the documents containing all the words.
+
+    Args:
+        query (str): The query
+
+        snapshot (IndexSnapshot): The indexes used for the query
+
+        expansions (list): The (term, score factor) pairs of the
+            words with typos
+
+        impact_index (ImpactIndex): The index read at the start of the
+            query (the current one by default)
+
+    Returns:
+        tuple[list, list, float]: The clauses, the groups and the
+            constant (see impact.ImpactIndex.top_k)
+    """
+
+    if impact_index is None:
+        impact_index = snapshot.impact_index
+
+    clauses = []
+    groups = []
+    constant = 0
+
+    words = [(normalize_query(query=query), 1)]
+    words += [([term], penalty) for term, penalty in expansions or []]
+
+    for tokens, factor in words:
+
+        # The fields of each word are given by the term dictionary, and
+        # its postings by its ID
+        term_ids = {token: snapshot.terms.get_id(token) for token in tokens}
+        token_fields = {
+            token: [] if term_id is None else snapshot.terms.get_fields(term_id)
+            for token, term_id in term_ids.items()
+        }
+
+        for token in tokens:
+            for field in token_fields[token]:
+                clauses.append((
+                    impact_index.get_postings(field, term_ids[token]),
+                    factor * FIELD_WEIGHTS[field]
+                ))
+
+        # As in get_score_presence_title, the bonus is given to every
+        # document when no word is in the titles
+        in_title = [token for token in tokens if "title" in token_fields[token]]
+        if in_title:
+            groups.append((
+                [
+                    impact_index.get_postings("title", term_ids[token])
+                    for token in in_title
+                ],
+                factor * FIELD_WEIGHTS["title"]
+            ))
+        else:
+            constant += factor * FIELD_WEIGHTS["title"]
+
+    return clauses, groups, constant
+
+
+def get_top_k_scores(
+    query: str,
+    snapshot: IndexSnapshot,
+    k: int = 10,
+    filters: str = None,
+    fuzzy_penalties: dict = None
+) -> dict:
+    """
+    Gives the k best documents with the scores of
+    get_score_for_all_url, without scoring all the documents: the
+    search stops once the documents left cannot enter the top k, so
+    a word present in every title costs about as much as a rare one.
+
+    Args:
+        query (str): The query
+
+        snapshot (IndexSnapshot): The indexes used for the query
+
+        k (int): The number of documents
+
+        filters (str): The facet filters (see filter_documents)
+
+        fuzzy_penalties (dict): The score factor for each number of
+            typos (see get_query_expansions)
+
+    Returns:
+        dict: The score of each of the k documents, the best first
+    """
+
+    allowed = None
+    if filters:
+        include, exclude = parse_filter(filters)
+        allowed = snapshot.facets.filter(include=include, exclude=exclude)
+
+    with instrumentation.timer("tp3_fuzzy_seconds"):
+        expansions = get_query_expansions(
+            query=query,
+            snapshot=snapshot,
+            penalties=fuzzy_penalties
+        )
+
+    # The postings, their order and the updated scores must come from
+    # the same version (see searcher.RankedScores)
+    ranked = snapshot.ranked
+
+    with instrumentation.timer("tp3_top_k_seconds"):
+        clauses, groups, constant = get_query_clauses(
+            query=query,
+            snapshot=snapshot,
+            expansions=expansions,
+            impact_index=ranked.impact_index
+        )
+        best = ranked.impact_index.top_k(
+            clauses=clauses,
+            groups=groups,
+            constant=constant,
+            k=k,
+            allowed=allowed,
+            updates=ranked.updates
+        )
+
+    instrumentation.count("tp3_queries_total")
+
+    return {snapshot.urls[doc_id]: score for doc_id, score in best}
+
+
+# 4. Semantic search
+
+
+def get_query_vector(query: str) -> np.ndarray:
+    """
+    Represents a query by the mean of its word vectors.
+
+    Args:
+        query (str): The query
+
+    Returns:
+        np.ndarray: The normalized vector
+    """
+
+    return normalize(nlp.make_doc(query.lower()).vector)
+
+
+@instrumentation.timed("tp3_semantic_seconds")
+def get_semantic_scores(
+    query: str,
+    snapshot: IndexSnapshot,
+    n_neighbours: int = 50
+) -> dict:
+    """
+    Finds the documents whose meaning is the closest to the query,
+    even without common words ("sweet gift" -> chocolate).
+
+    Args:
+        query (str): The query
+
+        snapshot (IndexSnapshot): The indexes used for the query
+
+        n_neighbours (int): The number of documents found
+
+    Returns:
+        dict: The cosine similarity of each document found
+    """
+
+    if snapshot.vector_index is None:
+        return {}
+
+    return dict(search_ann_index(
+        ann_index=snapshot.vector_index,
+        query_vector=get_query_vector(query=query),
+        k=n_neighbours
+    ))
+
+
+@instrumentation.timed("tp3_hybrid_seconds")
+def get_hybrid_scores(
+    query: str,
+    snapshot: IndexSnapshot,
+    n_neighbours: int = 50,
+    rrf_k: int = 60,
+    filters: str = None,
+    lexical_k: int = 200
+) -> dict:
+    """
+    Combines the lexical ranking (scores of get_score_for_all_url)
+    with the semantic ranking with Reciprocal Rank Fusion: each
+    ranking gives 1 / (rrf_k + rank) to a document.
+
+    Only the candidates are scored: the lexical_k best documents of
+    get_top_k_scores and the documents found by the semantic search.
+    The semantic hits missing from the lexical top are scored one by
+    one and ranked after it (their real lexical rank is lower, so
+    their fused score is slightly overestimated).
+
+    Args:
+        query (str): The query
+
+        snapshot (IndexSnapshot): The indexes used for the query
+
+        n_neighbours (int): The number of documents of the semantic
+            ranking
+
+        rrf_k (int): The constant of the fusion (the higher, the
+            less the first ranks dominate)
+
+        filters (str): The facet filters (see filter_documents)
+
+        lexical_k (int): The number of documents of the lexical
+            ranking (at least n_neighbours)
+
+    Returns:
+        dict: The fused score of each candidate document
+    """
+
+    lexical_scores = get_top_k_scores(
+        query=query,
+        snapshot=snapshot,
+        k=max(lexical_k, n_neighbours),
+        filters=filters
+    )
+    semantic_scores = get_semantic_scores(
+        query=query,
+        snapshot=snapshot,
+        n_neighbours=n_neighbours
+    )
+
+    # The documents removed by the filters stay removed
+    if filters:
+        include, exclude = parse_filter(filters)
+        allowed = snapshot.facets.filter(include=include, exclude=exclude)
+        semantic_scores = {
+            url: score for url, score in semantic_scores.items()
+            if snapshot.doc_ids.get(url, -1) in allowed
+        }
+
+    expansions = get_query_expansions(query=query, snapshot=snapshot)
+    static_scores = snapshot.static_scores
+    other_scores = {
+        url: get_score_presence_all(
             query=query,
-            url=document["url"]
+            url=url,
+            snapshot=snapshot,
+            expansions=expansions,
+            static_scores=static_scores
         )
+        for url in semantic_scores
+        if url not in lexical_scores and url in snapshot.doc_ids
+    }
+
+    lexical_ranking = list(lexical_scores)
+    lexical_ranking += sorted(other_scores, key=other_scores.get, reverse=True)
+
+    scores = dict.fromkeys(lexical_ranking, 0.0)
+
+    for rank, url in enumerate(lexical_ranking, start=1):
+        scores[url] += 1 / (rrf_k + rank)
+
+    semantic_ranking = sorted(
+        semantic_scores, key=semantic_scores.get, reverse=True
+    )
+    for rank, url in enumerate(semantic_ranking, start=1):
+        if url in scores:
+            scores[url] += 1 / (rrf_k + rank)
 
     return scores
 
 
+@instrumentation.timed("tp3_write_seconds")
 def write_jsonl(final_result: list):
 
     with open("output.jsonl", "w", encoding="utf-8") as f:
@@ -366,13 +860,6 @@ def write_jsonl(final_result: list):
             f.write("\n")
 
 
-query = "Energy drink"
-
-data = get_score_for_all_url(query=query, documents=documents)
-
-sorted_urls = sorted(data, key=data.get, reverse=True)
-
-
 def filter_and_preserve_order(documents: list, ordered_urls: list):
 
     lookup = {item["url"]: item for item in documents}
@@ -385,6 +872,34 @@ def filter_and_preserve_order(documents: list, ordered_urls: list):
     return result
 
 
-filtered = filter_and_preserve_order(documents, sorted_urls)
+if __name__ == "__main__":
+
+    documents = []
+    with open("TP3/rearranged_products.jsonl", "r", encoding="utf-8") as f:
+        for line in f:
+            documents.append(json.loads(line))
+
+    # The indexes are held in a snapshot which can be swapped with
+    # searcher.reload() when TP2 rebuilds them
+    searcher = Searcher(input_dir="TP3/input")
+
+    query = "Energy drink"
+
+    with searcher.snapshot() as snapshot:
+        data = get_score_for_all_url(
+            query=query,
+            documents=documents,
+            snapshot=snapshot
+        )
+
+    with instrumentation.timer("tp3_sort_seconds"):
+        sorted_urls = sorted(data, key=data.get, reverse=True)
+
+    filtered = filter_and_preserve_order(documents, sorted_urls)
+
+    write_jsonl(filtered)
 
-write_jsonl(filtered)
+    # Run with METRICS=1 to get the time spent in each stage
+    if instrumentation.is_enabled():
+        instrumentation.save_json_report("TP3/metrics.json")
+        instrumentation.save_prometheus("TP3/metrics.prom")
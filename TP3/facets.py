@@ -0,0 +1,415 @@
+import re
+from array import array
+
+
+# As in Roaring bitmaps, the doc IDs are split in chunks of 2^16 values.
+# A chunk with few documents is stored as a sorted array of 16 bits
+# integers, a chunk with many documents as a bitset of 2^16 bits.
+CHUNK_BITS = 16
+CHUNK_SIZE = 1 << CHUNK_BITS
+ARRAY_MAX_SIZE = 4096
+
+
+def _array_to_bitset(values: array) -> int:
+    bits = bytearray(CHUNK_SIZE // 8)
+
+    for value in values:
+        bits[value >> 3] |= 1 << (value & 7)
+
+    return int.from_bytes(bits, "little")
+
+
+def _bitset_to_array(bitset: int) -> array:
+    # bin() gives the bits from the highest to the lowest one, we reverse
+    # it so that the position of a "1" is the value
+    bits = bin(bitset)[:1:-1]
+    values = array("H")
+
+    position = bits.find("1")
+    while position != -1:
+        values.append(position)
+        position = bits.find("1", position + 1)
+
+    return values
+
+
+def _compress(bitset: int):
+    """
+    Gives the smallest representation of a chunk (None if empty).
+    """
+
+    size = bitset.bit_count()
+
+    if size == 0:
+        return None
+
+    if size <= ARRAY_MAX_SIZE:
+        return _bitset_to_array(bitset)
+
+    return bitset
+
+
+def _to_bitset(chunk) -> int:
+    return chunk if isinstance(chunk, int) else _array_to_bitset(chunk)
+
+
+class Bitmap:
+    """
+    A compressed set of doc IDs (Roaring-style).
+    """
+
+    __slots__ = ("chunks",)
+
+    def __init__(self, chunks: dict = None):
+        self.chunks = chunks or {}
+
+    @classmethod
+    def from_ids(cls, doc_ids) -> "Bitmap":
+        """
+        Creates a bitmap from doc IDs.
+
+        Args:
+            doc_ids (iterable[int]): The doc IDs
+
+        Returns:
+            Bitmap: The bitmap
+        """
+
+        grouped = {}
+
+        for doc_id in doc_ids:
+            grouped.setdefault(doc_id >> CHUNK_BITS, set()).add(
+                doc_id & (CHUNK_SIZE - 1)
+            )
+
+        chunks = {}
+
+        for key, values in grouped.items():
+            chunk = array("H", sorted(values))
+            chunks[key] = (
+                chunk if len(chunk) <= ARRAY_MAX_SIZE
+                else _array_to_bitset(chunk)
+            )
+
+        return cls(chunks)
+
+    @classmethod
+    def full(cls, size: int) -> "Bitmap":
+        """
+        Creates the bitmap of all the doc IDs from 0 to size - 1.
+
+        Args:
+            size (int): The number of documents
+
+        Returns:
+            Bitmap: The bitmap
+        """
+
+        chunks = {}
+
+        for key in range((size - 1) // CHUNK_SIZE + 1 if size else 0):
+            length = min(CHUNK_SIZE, size - key * CHUNK_SIZE)
+            chunks[key] = _compress((1 << length) - 1)
+
+        return cls(chunks)
+
+    def __len__(self) -> int:
+        return sum(
+            chunk.bit_count() if isinstance(chunk, int) else len(chunk)
+            for chunk in self.chunks.values()
+        )
+
+    def __bool__(self) -> bool:
+        return bool(self.chunks)
+
+    def __contains__(self, doc_id: int) -> bool:
+        chunk = self.chunks.get(doc_id >> CHUNK_BITS)
+
+        if chunk is None:
+            return False
+
+        value = doc_id & (CHUNK_SIZE - 1)
+
+        if isinstance(chunk, int):
+            return bool(chunk >> value & 1)
+
+        # Binary search in the sorted array
+        low, high = 0, len(chunk)
+        while low < high:
+            middle = (low + high) // 2
+            if chunk[middle] < value:
+                low = middle + 1
+            else:
+                high = middle
+
+        return low < len(chunk) and chunk[low] == value
+
+    def __iter__(self):
+        for key in sorted(self.chunks):
+            chunk = self.chunks[key]
+            offset = key << CHUNK_BITS
+
+            if isinstance(chunk, int):
+                chunk = _bitset_to_array(chunk)
+
+            for value in chunk:
+                yield offset + value
+
+    def __eq__(self, other) -> bool:
+        return isinstance(other, Bitmap) and list(self) == list(other)
+
+    def __and__(self, other: "Bitmap") -> "Bitmap":
+        chunks = {}
+
+        for key in self.chunks.keys() & other.chunks.keys():
+            left, right = self.chunks[key], other.chunks[key]
+
+            if isinstance(left, array) and isinstance(right, array):
+                # Both chunks are small, a set intersection is enough
+                values = set(left).intersection(right)
+                chunk = array("H", sorted(values)) if values else None
+            else:
+                chunk = _compress(_to_bitset(left) & _to_bitset(right))
+
+            if chunk is not None:
+                chunks[key] = chunk
+
+        return Bitmap(chunks)
+
+    def __or__(self, other: "Bitmap") -> "Bitmap":
+        chunks = dict(self.chunks)
+
+        for key, right in other.chunks.items():
+            left = chunks.get(key)
+            chunks[key] = right if left is None else _compress(
+                _to_bitset(left) | _to_bitset(right)
+            )
+
+        return Bitmap(chunks)
+
+    def __sub__(self, other: "Bitmap") -> "Bitmap":
+        chunks = {}
+
+        for key, left in self.chunks.items():
+            right = other.chunks.get(key)
+
+            if right is None:
+                chunks[key] = left
+                continue
+
+            chunk = _compress(_to_bitset(left) & ~_to_bitset(right))
+            if chunk is not None:
+                chunks[key] = chunk
+
+        return Bitmap(chunks)
+
+    def __repr__(self) -> str:
+        return f"Bitmap({len(self)} documents)"
+
+
+class FacetIndex:
+    """
+    The postings of the facets (brand, origin) stored as bitmaps
+    of doc IDs.
+    """
+
+    def __init__(self, size: int, synonyms: dict = None):
+        self.size = size
+        self.all_documents = Bitmap.full(size)
+        self.fields = {}
+
+        # For the origin: "america" -> "usa"
+        self.synonyms = {}
+        for value, names in (synonyms or {}).items():
+            for name in names:
+                self.synonyms[name.lower()] = value
+
+    @classmethod
+    def from_indexes(
+        cls,
+        indexes: dict,
+        doc_ids: dict,
+        synonyms: dict = None
+    ) -> "FacetIndex":
+        """
+        Creates the bitmaps from indexes associating each value to
+        the list of URLs of the documents (brand_index, origin_index).
+
+        Args:
+            indexes (dict): The index of each field ({"brand": ...})
+
+            doc_ids (dict): The doc ID of each URL
+
+            synonyms (dict): The synonyms of the values
+
+        Returns:
+            FacetIndex: The facets
+        """
+
+        facets = cls(size=len(doc_ids), synonyms=synonyms)
+
+        for field, index in indexes.items():
+            facets.fields[field] = {
+                value: Bitmap.from_ids(
+                    doc_ids[url] for url in urls if url in doc_ids
+                )
+                for value, urls in index.items()
+            }
+
+        return facets
+
+    def get(self, field: str, value: str) -> Bitmap:
+        """
+        Gives the documents having a given value for a field.
+
+        Args:
+            field (str): The field (brand, origin)
+
+            value (str): The value
+
+        Returns:
+            Bitmap: The documents
+        """
+
+        value = value.lower()
+        postings = self.fields.get(field, {})
+
+        if value not in postings:
+            value = self.synonyms.get(value, value)
+
+        return postings.get(value, Bitmap())
+
+    def contains(self, field: str, value: str, doc_id: int) -> bool:
+        """
+        Tells if a document has a given value for a field.
+
+        Args:
+            field (str): The field (brand, origin)
+
+            value (str): The value
+
+            doc_id (int): The doc ID
+
+        Returns:
+            bool
+        """
+
+        postings = self.fields.get(field, {})
+
+        return value in postings and doc_id in postings[value]
+
+    def filter(self, include: dict = None, exclude: dict = None) -> Bitmap:
+        """
+        Gives the documents matching filters. The values of a
+        condition are combined with OR, the conditions with AND (also
+        the ones on a same field).
+
+        Args:
+            include (dict): The conditions of each field, each one
+                being its list of accepted values, e.g.
+                {"origin": [["usa", "france"]], "brand": [["chocodelight"]]}
+
+            exclude (dict): The rejected values of each field
+
+        Returns:
+            Bitmap: The documents
+        """
+
+        unknown = set(include or {}) | set(exclude or {})
+        unknown -= set(self.fields)
+        if unknown:
+            raise ValueError(f"Unknown filter fields: {sorted(unknown)}")
+
+        result = self.all_documents
+
+        for field, conditions in (include or {}).items():
+            for values in conditions:
+                accepted = Bitmap()
+                for value in values:
+                    accepted = accepted | self.get(field, value)
+                result = result & accepted
+
+        for field, values in (exclude or {}).items():
+            for value in values:
+                result = result - self.get(field, value)
+
+        return result
+
+    def count(self, field: str, documents: Bitmap = None) -> dict:
+        """
+        Counts the documents of each value of a field.
+
+        Args:
+            field (str): The field (brand, origin)
+
+            documents (Bitmap): The documents considered (all of
+                them by default)
+
+        Returns:
+            dict: The number of documents of each value
+        """
+
+        counts = {}
+
+        for value, postings in self.fields.get(field, {}).items():
+            number = len(postings if documents is None else postings & documents)
+            if number:
+                counts[value] = number
+
+        return dict(sorted(counts.items(), key=lambda item: -item[1]))
+
+
+def parse_filter(expression: str) -> tuple[dict, dict]:
+    """
+    Parses a filter such as "origin=usa AND brand=chocodelight AND
+    NOT brand=gamebeast". Several values of a field can be given
+    with "|": "origin=usa|france". Conditions on a same field are
+    combined with AND, like the other ones. OR is only supported
+    inside a condition ("|"): "origin=usa OR brand=x" is refused.
+
+    Args:
+        expression (str): The filter
+
+    Returns:
+        tuple[dict, dict]: The included values (a list of values for
+            each condition) and the excluded values of each field
+
+    Raises:
+        ValueError: If a condition is malformed
+    """
+
+    include, exclude = {}, {}
+
+    if not expression.strip():
+        return include, exclude
+
+    if re.search(r"(^|\s)OR(\s|$)", expression):
+        raise ValueError(
+            f"Invalid filter: {expression!r} (OR is only supported "
+            "between the values of a field: origin=usa|japan)"
+        )
+
+    for condition in re.split(r"\s+AND\s+", expression.strip()):
+        negated = condition.startswith("NOT ")
+        if negated:
+            condition = condition[4:]
+
+        field, _, values = condition.partition("=")
+        field = field.strip().lower()
+        values = [value.strip() for value in values.split("|")]
+
+        # An operator left in a value (e.g. a trailing AND) would make
+        # the condition match nothing
+        if not re.fullmatch(r"\w+", field) or not all(
+            value and "=" not in value
+            and not re.search(r"(^|\s)(AND|NOT)(\s|$)", value)
+            for value in values
+        ):
+            raise ValueError(f"Invalid filter: {condition!r}")
+
+        if negated:
+            exclude.setdefault(field, []).extend(values)
+        else:
+            include.setdefault(field, []).append(values)
+
+    return include, exclude
@@ -0,0 +1,304 @@
+import heapq
+
+import numpy as np
+
+from postings import TermPostings
+
+
+# Number of consecutive ranks scored at once, each block having its own
+# upper bound
+BLOCK_SIZE = 2048
+
+
+class ImpactIndex:
+    """
+    The postings of the fields with the documents renumbered by
+    decreasing static score (the rank). In every posting list, the
+    documents are then sorted by impact (weight of the field + static
+    score), so a top-k search can stop as soon as the documents left
+    can no longer enter the top k, however long the lists are.
+
+    All the postings are converted when the index is created, i.e.
+    while the snapshot is loaded, not by the first queries. The index
+    is never modified: when the static scores change, rerank gives a
+    new one.
+    """
+
+    def __init__(self, static_scores: np.ndarray, postings: TermPostings):
+        """
+        Args:
+            static_scores (np.ndarray): The static score of each doc ID
+
+            postings (TermPostings): The doc IDs of each term
+        """
+
+        # doc IDs by rank, and rank of each doc ID
+        self.doc_ids = np.argsort(-static_scores, kind="stable")
+        self.ranks = np.empty_like(self.doc_ids)
+        self.ranks[self.doc_ids] = np.arange(len(self.doc_ids))
+
+        self.static_scores = static_scores[self.doc_ids]
+        self.static_scores.flags.writeable = False
+
+        # The same layout as the postings, with the ranks sorted for
+        # each term instead of the doc IDs
+        self.postings = postings
+        self._fields = {}
+        for field, (offsets, doc_ids) in postings.fields.items():
+            ranks = self.ranks[doc_ids]
+            ranks = ranks[np.lexsort((ranks, postings.get_segments(field)))]
+            ranks = ranks.astype(np.int32)
+            ranks.flags.writeable = False
+            self._fields[field] = (offsets, ranks)
+
+    def rerank(self, static_scores: np.ndarray) -> "ImpactIndex":
+        """
+        Gives the same postings with the documents renumbered by new
+        static scores (after new reviews).
+
+        Args:
+            static_scores (np.ndarray): The static score of each doc ID
+
+        Returns:
+            ImpactIndex: The new index
+        """
+
+        return ImpactIndex(static_scores=static_scores, postings=self.postings)
+
+    def get_postings(self, field: str, term_id: int) -> np.ndarray:
+        """
+        Gives the sorted ranks of the documents containing a term.
+
+        Args:
+            field (str): The field (title, description, brand, origin)
+
+            term_id (int): The ID of the term (None for an unknown term)
+
+        Returns:
+            np.ndarray: The ranks
+        """
+
+        if term_id is None or field not in self._fields:
+            return EMPTY
+
+        offsets, ranks = self._fields[field]
+
+        return ranks[offsets[term_id]:offsets[term_id + 1]]
+
+    def get_bounds(
+        self,
+        clauses: list,
+        constant: float,
+        allowed_ranks: np.ndarray = None
+    ) -> np.ndarray:
+        """
+        Gives an upper bound of the score of the documents of each
+        block: the best static score of the block, plus the weight of
+        the clauses having a posting in the block.
+        """
+
+        size = len(self.static_scores)
+        starts = np.arange(0, size, BLOCK_SIZE)
+        edges = np.append(starts, size)
+
+        bounds = self.static_scores[starts] + constant
+
+        for postings, weight in clauses:
+            present = np.diff(np.searchsorted(postings, edges)) > 0
+            bounds += weight * present
+
+        if allowed_ranks is not None:
+            present = np.diff(np.searchsorted(allowed_ranks, edges)) > 0
+            bounds[~present] = -np.inf
+
+        return bounds
+
+    def top_k(
+        self,
+        clauses: list,
+        groups: list = (),
+        constant: float = 0,
+        k: int = 10,
+        allowed=None,
+        updates: dict = None
+    ) -> list[tuple[int, float]]:
+        """
+        Finds the k documents with the best score, the score of a
+        document being its static score, plus the weight of each
+        clause whose postings contain it, plus the weight of each group
+        whose postings all contain it, plus a constant.
+
+        The documents are read by blocks of increasing ranks. The
+        blocks whose upper bound cannot enter the top k are skipped,
+        and the search stops once none of the blocks left can. The
+        documents of a block are scored together (numpy), from the
+        postings of the block only.
+
+        Args:
+            clauses (list): The (postings, weight) pairs
+
+            groups (list): The (list of postings, weight) pairs
+
+            constant (float): The score given to every document
+
+            k (int): The number of documents
+
+            allowed: The doc IDs which can be returned (all of them
+                by default), supporting the in and len operators
+
+            updates (dict): The static score of the documents which
+                changed since the index was created (new reviews); they
+                are scored first, as their rank no longer matches their
+                score
+
+        Returns:
+            list[tuple[int, float]]: The (doc ID, score) pairs, the
+                best first (the lowest rank first between equal scores)
+        """
+
+        static_scores = self.static_scores
+        size = len(static_scores)
+
+        if k <= 0 or size == 0:
+            return []
+
+        # A group is a clause whose postings are the intersection of
+        # its postings, so that its bound is only counted where it applies
+        clauses = list(clauses)
+        for all_postings, weight in groups:
+            clauses.append((intersect(all_postings), weight))
+        clauses = [(postings, weight) for postings, weight in clauses if len(postings)]
+
+        # Min-heap of the k best (score, -rank)
+        best = []
+
+        def push(score: float, rank: int):
+            if len(best) < k:
+                heapq.heappush(best, (score, -rank))
+            elif (score, -rank) > best[0]:
+                heapq.heapreplace(best, (score, -rank))
+
+        # A selective filter is turned into ranks, so that whole blocks
+        # are skipped; otherwise each candidate is tested
+        allowed_ranks = None
+        if allowed is not None and len(allowed) * 8 < size:
+            allowed_ranks = np.sort(self.ranks[
+                np.fromiter(allowed, dtype=np.int64, count=len(allowed))
+            ])
+            allowed = None
+
+        updated_ranks = np.empty(0, dtype=np.int64)
+        if updates:
+            updated_ranks = self.ranks[
+                np.fromiter(updates.keys(), dtype=np.int64, count=len(updates))
+            ]
+            updated_scores = constant + np.fromiter(
+                updates.values(), dtype=np.float64, count=len(updates)
+            )
+            for postings, weight in clauses:
+                updated_scores[contains(postings, updated_ranks)] += weight
+
+            if allowed_ranks is not None:
+                updated_scores[~contains(allowed_ranks, updated_ranks)] = -np.inf
+
+            # By decreasing score, then increasing rank
+            for position in np.lexsort((updated_ranks, -updated_scores)).tolist():
+                score = float(updated_scores[position])
+                rank = int(updated_ranks[position])
+                if score == -np.inf or (len(best) == k and (score, -rank) <= best[0]):
+                    break
+                if allowed is not None and int(self.doc_ids[rank]) not in allowed:
+                    continue
+                push(score, rank)
+
+            updated_ranks = np.sort(updated_ranks)
+
+        bounds = self.get_bounds(clauses, constant, allowed_ranks)
+
+        # The best bound of each block and the following ones
+        remaining = np.maximum.accumulate(bounds[::-1])[::-1]
+
+        for block, bound in enumerate(bounds.tolist()):
+
+            threshold = best[0][0] if len(best) == k else -np.inf
+            if remaining[block] <= threshold:
+                break
+            if bound <= threshold:
+                continue
+
+            start = block * BLOCK_SIZE
+            end = min(start + BLOCK_SIZE, size)
+
+            scores = static_scores[start:end] + constant
+            for postings, weight in clauses:
+                scores[get_block(postings, start, end) - start] += weight
+
+            # Already scored with their new static score
+            scores[get_block(updated_ranks, start, end) - start] = -np.inf
+
+            if allowed_ranks is not None:
+                allowed_scores = np.full_like(scores, -np.inf)
+                positions = get_block(allowed_ranks, start, end) - start
+                allowed_scores[positions] = scores[positions]
+                scores = allowed_scores
+
+            # The candidates by decreasing score, then increasing rank
+            candidates = np.flatnonzero(scores > threshold)
+            candidates = candidates[np.lexsort((candidates, -scores[candidates]))]
+
+            for position, score in zip(
+                candidates.tolist(), scores[candidates].tolist()
+            ):
+                rank = start + position
+                if len(best) == k and (score, -rank) <= best[0]:
+                    break
+                if allowed is not None and int(self.doc_ids[rank]) not in allowed:
+                    continue
+                push(score, rank)
+
+        return [
+            (int(self.doc_ids[-negative_rank]), score)
+            for score, negative_rank in sorted(best, reverse=True)
+        ]
+
+
+EMPTY = np.empty(0, dtype=np.int32)
+EMPTY.flags.writeable = False
+
+
+def get_block(postings: np.ndarray, start: int, end: int) -> np.ndarray:
+    """
+    Gives the ranks of the postings between start (included) and end
+    (excluded).
+    """
+
+    low, high = np.searchsorted(postings, (start, end))
+
+    return postings[low:high]
+
+
+def intersect(all_postings: list) -> np.ndarray:
+    """
+    Gives the ranks present in all the postings.
+    """
+
+    all_postings = sorted(all_postings, key=len)
+    ranks = all_postings[0]
+
+    for postings in all_postings[1:]:
+        ranks = np.intersect1d(ranks, postings, assume_unique=True)
+
+    return ranks
+
+
+def contains(postings: np.ndarray, ranks: np.ndarray) -> np.ndarray:
+    """
+    Tells for each rank if it is in the postings.
+    """
+
+    if len(postings) == 0:
+        return np.zeros(len(ranks), dtype=bool)
+
+    positions = np.minimum(np.searchsorted(postings, ranks), len(postings) - 1)
+
+    return postings[positions] == ranks
@@ -0,0 +1,134 @@
+import bisect
+
+import numpy as np
+
+
+class TermPostings:
+    """
+    The postings of the fields (title, description, brand, origin)
+    keyed by the term IDs of the term dictionary. The doc IDs of all
+    the terms of a field are stored one after the other in a single
+    array, sorted for each term: the postings of the term ID i are
+    doc_ids[offsets[i]:offsets[i + 1]].
+    """
+
+    def __init__(self, fields: dict):
+        """
+        Args:
+            fields (dict): The (offsets, doc IDs) arrays of each field
+        """
+
+        self.fields = fields
+
+        for offsets, doc_ids in fields.values():
+            offsets.flags.writeable = False
+            doc_ids.flags.writeable = False
+
+        # Reading one value of a memoryview gives an int, much faster
+        # than a numpy scalar for the lookups of a single document
+        self._views = {
+            field: (memoryview(offsets), memoryview(doc_ids))
+            for field, (offsets, doc_ids) in fields.items()
+        }
+
+    @classmethod
+    def from_indexes(
+        cls,
+        indexes: dict,
+        terms,
+        doc_ids: dict
+    ) -> "TermPostings":
+        """
+        Converts indexes associating each term to the URLs of its
+        documents (a list, or a dict of positions).
+
+        Args:
+            indexes (dict): The index of each field ({"title": ...})
+
+            terms (TermDictionary): The dictionary of the terms of
+                these indexes
+
+            doc_ids (dict): The doc ID of each URL
+
+        Returns:
+            TermPostings: The postings
+        """
+
+        fields = {}
+
+        for field, index in indexes.items():
+            postings = {
+                terms.get_id(term): np.unique(np.fromiter(
+                    (doc_ids[url] for url in urls if url in doc_ids),
+                    dtype=np.int32
+                ))
+                for term, urls in index.items()
+            }
+
+            lengths = np.zeros(len(terms), dtype=np.int64)
+            for term_id, term_doc_ids in postings.items():
+                lengths[term_id] = len(term_doc_ids)
+
+            offsets = np.zeros(len(terms) + 1, dtype=np.int64)
+            np.cumsum(lengths, out=offsets[1:])
+
+            fields[field] = (offsets, np.concatenate(
+                [postings[term_id] for term_id in sorted(postings)]
+                or [np.empty(0, dtype=np.int32)]
+            ))
+
+        return cls(fields)
+
+    def get(self, field: str, term_id: int) -> np.ndarray:
+        """
+        Gives the sorted doc IDs of the documents containing a term.
+
+        Args:
+            field (str): The field
+
+            term_id (int): The ID of the term
+
+        Returns:
+            np.ndarray: The doc IDs (read-only)
+        """
+
+        offsets, doc_ids = self.fields[field]
+
+        return doc_ids[offsets[term_id]:offsets[term_id + 1]]
+
+    def contains(self, field: str, term_id: int, doc_id: int) -> bool:
+        """
+        Tells if a document contains a term in a field.
+
+        Args:
+            field (str): The field
+
+            term_id (int): The ID of the term
+
+            doc_id (int): The doc ID
+
+        Returns:
+            bool
+        """
+
+        offsets, doc_ids = self._views[field]
+        end = offsets[term_id + 1]
+
+        position = bisect.bisect_left(doc_ids, doc_id, offsets[term_id], end)
+
+        return position < end and doc_ids[position] == doc_id
+
+    def get_segments(self, field: str) -> np.ndarray:
+        """
+        Gives the term ID of each entry of the doc IDs of a field.
+
+        Args:
+            field (str): The field
+
+        Returns:
+            np.ndarray: The term IDs
+        """
+
+        offsets, _ = self.fields[field]
+
+        return np.repeat(np.arange(len(offsets) - 1), np.diff(offsets))
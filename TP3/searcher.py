@@ -0,0 +1,739 @@
+import json
+import os
+import sys
+import threading
+from contextlib import contextmanager
+from types import MappingProxyType
+
+import numpy as np
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from common import instrumentation  # noqa: E402
+from common.ann import load_ann_index  # noqa: E402
+from common.autocomplete import Autocomplete  # noqa: E402
+from common.review_stats import ReviewStats  # noqa: E402
+from common.term_dictionary import (  # noqa: E402
+    TermDictionary, create_term_dictionary, load_term_dictionary
+)
+from facets import FacetIndex  # noqa: E402
+from impact import ImpactIndex  # noqa: E402
+from postings import TermPostings  # noqa: E402
+from static_features import StaticScorer  # noqa: E402
+
+
+INDEX_FILES = {
+    "brand_index": "brand_index.json",
+    "description_index": "description_index.json",
+    "origin_index": "origin_index.json",
+    "origin_synonyms": "origin_synonyms.json",
+    "reviews_index": "reviews_index.json",
+    "title_index": "title_index.json",
+}
+
+# The inverted index of each field, converted to postings keyed by
+# term ID at load time (see postings.TermPostings)
+FIELD_INDEXES = {
+    "title": "title_index",
+    "description": "description_index",
+    "brand": "brand_index",
+    "origin": "origin_index",
+}
+
+# Indexes which are used when TP2 has produced them
+OPTIONAL_INDEX_FILES = {
+    "autocomplete": "autocomplete.bin",
+    "fuzzy_index": "fuzzy_index.json",
+    "pagerank_index": "pagerank_index.json",
+    "review_stats": "review_stats.npz",
+    "term_dictionary": "term_dictionary.bin",
+    "vector_index": "vector_index.npz",
+}
+
+# Number of documents whose static score changed since the impact index
+# was ordered, above which it is ordered again (each query scores these
+# documents apart)
+RERANK_THRESHOLD = 1000
+
+
+def get_index_signature(input_dir: str) -> tuple:
+    """
+    Gives a signature of the index files of a directory, used
+    to know if the indexes have been rebuilt.
+
+    Args:
+        input_dir (str): The directory containing the indexes
+
+    Returns:
+        tuple: The (file name, modification time, size) of each index
+    """
+
+    signature = []
+
+    for file_name in sorted(INDEX_FILES.values()):
+        stat = os.stat(os.path.join(input_dir, file_name))
+        signature.append((file_name, stat.st_mtime_ns, stat.st_size))
+
+    for file_name in sorted(OPTIONAL_INDEX_FILES.values()):
+        path = os.path.join(input_dir, file_name)
+        if os.path.exists(path):
+            stat = os.stat(path)
+            signature.append((file_name, stat.st_mtime_ns, stat.st_size))
+
+    return tuple(signature)
+
+
+def get_urls(indexes: dict) -> tuple[str]:
+    """
+    Gives the URL of each doc ID. Every document has an entry in the
+    reviews index, so its order (the one of the crawl) is used.
+
+    Args:
+        indexes (dict): All the indexes
+
+    Returns:
+        tuple[str]: The URLs, the doc ID being the position
+    """
+
+    urls = dict.fromkeys(indexes["reviews_index"])
+
+    # Documents missing from the reviews index get the following IDs
+    for name in ("title_index", "description_index"):
+        for postings in indexes[name].values():
+            urls.update(dict.fromkeys(postings))
+
+    for name in ("brand_index", "origin_index"):
+        for postings in indexes[name].values():
+            urls.update(dict.fromkeys(postings))
+
+    return tuple(urls)
+
+
+def get_static_rank(pagerank_index: dict, urls: tuple) -> np.ndarray:
+    """
+    Gives the static rank of each doc ID from the PageRank index,
+    scaled between 0 and 1 (0 for the documents without PageRank).
+
+    Args:
+        pagerank_index (dict): The PageRank of each URL (or None)
+
+        urls (tuple): The URL of each doc ID
+
+    Returns:
+        np.ndarray: The static rank of each doc ID
+    """
+
+    static_rank = np.zeros(len(urls), dtype=np.float32)
+
+    if not pagerank_index:
+        return static_rank
+
+    for doc_id, url in enumerate(urls):
+        static_rank[doc_id] = pagerank_index.get(url, 0)
+
+    # A few hubs (listing pages) get most of the PageRank, the log
+    # keeps the other documents distinguishable
+    static_rank = np.log1p(len(pagerank_index) * static_rank)
+    if static_rank.max() > 0:
+        static_rank /= static_rank.max()
+
+    static_rank.flags.writeable = False
+
+    return static_rank
+
+
+class RankedScores:
+    """
+    The static score of each doc ID, the impact index ordered by these
+    scores when it was created, and the new score of the documents
+    updated since. It is never modified: new reviews give a new
+    version (copy on write), so that a query keeps the one it started
+    with.
+    """
+
+    __slots__ = ("static_scores", "impact_index", "updates")
+
+    def __init__(
+        self,
+        static_scores: np.ndarray,
+        impact_index: ImpactIndex,
+        updates: dict = None
+    ):
+        """
+        Args:
+            static_scores (np.ndarray): The static score of each doc ID
+
+            impact_index (ImpactIndex): The postings ordered by static
+                score
+
+            updates (dict): The static score of the documents whose
+                rank no longer matches their score
+        """
+
+        static_scores.flags.writeable = False
+
+        self.static_scores = static_scores
+        self.impact_index = impact_index
+        self.updates = MappingProxyType(updates or {})
+
+    def update(self, doc_ids: np.ndarray, scores: np.ndarray) -> "RankedScores":
+        """
+        Gives a version with new static scores for some documents.
+
+        Args:
+            doc_ids (np.ndarray): The doc IDs
+
+            scores (np.ndarray): Their new static score
+
+        Returns:
+            RankedScores: The new version
+        """
+
+        static_scores = self.static_scores.copy()
+        static_scores[doc_ids] = scores
+
+        updates = dict(self.updates)
+        updates.update(zip(doc_ids.tolist(), scores.tolist()))
+
+        return RankedScores(static_scores, self.impact_index, updates)
+
+
+class IndexSnapshot:
+    """
+    A version of all the indexes used by the searcher. Only the
+    reviews received after the load (add_reviews) change the static
+    scores of their documents, by replacing the RankedScores: a query
+    reads the one of its start.
+
+    The snapshot counts the queries that are currently using it, so
+    that an old version can be dropped once all of them are over.
+    """
+
+    __slots__ = (
+        "version", "signature", "origin_synonyms", "reviews_index",
+        "fuzzy_index", "vector_index", "autocomplete", "terms", "postings",
+        "urls", "doc_ids", "facets", "static_rank", "review_stats",
+        "static_scorer", "ranked", "_references", "_retired", "_lock", "_drained"
+    )
+
+    def __init__(
+        self,
+        indexes: dict,
+        version: int,
+        signature: tuple = (),
+        static_weights: dict = None
+    ):
+        self.version = version
+        self.signature = signature
+
+        # The inverted indexes of the fields are only kept as postings
+        for name in INDEX_FILES.keys() - FIELD_INDEXES.values():
+            setattr(self, name, MappingProxyType(indexes[name]))
+
+        fields = {field: indexes[name] for field, name in FIELD_INDEXES.items()}
+
+        # None when the index has not been built
+        self.fuzzy_index = indexes.get("fuzzy_index")
+        self.vector_index = indexes.get("vector_index")
+        self.autocomplete = indexes.get("autocomplete")
+
+        # The IDs of the terms are shared by all the fields. A dictionary
+        # left from older indexes would give wrong IDs: it is built again
+        self.terms = indexes.get("term_dictionary")
+        if self.terms is None or not self.terms.matches(fields):
+            if self.terms is not None:
+                instrumentation.count("tp3_stale_term_dictionary_total")
+            self.terms = TermDictionary(create_term_dictionary(fields))
+
+        self.urls = get_urls(indexes)
+        self.doc_ids = MappingProxyType(
+            {url: doc_id for doc_id, url in enumerate(self.urls)}
+        )
+
+        self.postings = TermPostings.from_indexes(
+            indexes=fields,
+            terms=self.terms,
+            doc_ids=self.doc_ids
+        )
+
+        self.facets = FacetIndex.from_indexes(
+            indexes={
+                "brand": indexes["brand_index"],
+                "origin": indexes["origin_index"],
+            },
+            doc_ids=self.doc_ids,
+            synonyms=indexes["origin_synonyms"]
+        )
+
+        self.static_rank = get_static_rank(
+            pagerank_index=indexes.get("pagerank_index"),
+            urls=self.urls
+        )
+
+        # The aggregates saved by TP2 know the reviews one by one and
+        # where the review log was read up to
+        self.review_stats = indexes.get("review_stats")
+        if self.review_stats is None:
+            self.review_stats = ReviewStats.from_index(indexes["reviews_index"])
+
+        # The query-independent part of the score (reviews, PageRank)
+        # is computed once, and read by doc ID at query time
+        self.static_scorer = StaticScorer(
+            review_stats=self.review_stats,
+            urls=self.urls,
+            static_rank=self.static_rank,
+            weights=static_weights
+        )
+        static_scores = self.static_scorer.get_scores()
+
+        # All the postings are converted here, in the loading thread
+        self.ranked = RankedScores(
+            static_scores=static_scores,
+            impact_index=ImpactIndex(
+                static_scores=static_scores,
+                postings=self.postings
+            )
+        )
+
+        self._references = 0
+        self._retired = False
+        self._lock = threading.Lock()
+        self._drained = threading.Event()
+
+    @property
+    def static_scores(self) -> np.ndarray:
+        return self.ranked.static_scores
+
+    @property
+    def impact_index(self) -> ImpactIndex:
+        return self.ranked.impact_index
+
+    @property
+    def updated_doc_ids(self):
+        return self.ranked.updates.keys()
+
+    def _update_static_scores(self, urls: set[str]) -> int:
+        doc_ids = np.array(
+            [self.doc_ids[url] for url in urls if url in self.doc_ids],
+            dtype=np.int64
+        )
+
+        if len(doc_ids):
+            self.ranked = self.ranked.update(
+                doc_ids, self.static_scorer.get_scores(doc_ids)
+            )
+
+        return len(doc_ids)
+
+    def add_reviews(self, reviews: list[dict]) -> int:
+        """
+        Takes new reviews into account without rebuilding the indexes:
+        only the aggregates and the static score of their documents
+        are updated.
+
+        Args:
+            reviews (list[dict]): The {"url", "rating", "date"} reviews
+
+        Returns:
+            int: The number of documents whose score changed
+        """
+
+        with self._lock:
+            for review in reviews:
+                self.review_stats.add(
+                    review["url"], review["rating"], review.get("date")
+                )
+
+            return self._update_static_scores(
+                {review["url"] for review in reviews}
+            )
+
+    def update_from_review_log(self, path: str) -> int:
+        """
+        Takes into account the reviews appended to the review log
+        since the last call (or since TP2 saved the aggregates).
+
+        Args:
+            path (str): The path of the log
+
+        Returns:
+            int: The number of documents whose score changed
+        """
+
+        with self._lock:
+            return self._update_static_scores(
+                self.review_stats.update_from_log(path)
+            )
+
+    def rerank(self) -> int:
+        """
+        Orders the impact index again by the current static scores, so
+        that the queries no longer score the updated documents apart.
+        The ordering is done without the lock: the reviews received
+        meanwhile are kept as updates of the new version.
+
+        Returns:
+            int: The number of updates left
+        """
+
+        ranked = self.ranked
+        if not ranked.updates:
+            return 0
+
+        impact_index = ranked.impact_index.rerank(ranked.static_scores)
+
+        with self._lock:
+            static_scores = self.ranked.static_scores
+            doc_ids = np.flatnonzero(static_scores != ranked.static_scores)
+
+            self.ranked = RankedScores(
+                static_scores=static_scores,
+                impact_index=impact_index,
+                updates=dict(zip(
+                    doc_ids.tolist(), static_scores[doc_ids].tolist()
+                ))
+            )
+
+            return len(doc_ids)
+
+    def get_doc_ids(self, field: str, term: str) -> np.ndarray:
+        """
+        Gives the doc IDs of the documents containing a term in
+        a field.
+
+        Args:
+            field (str): The field (title, description, brand, origin)
+
+            term (str): The term
+
+        Returns:
+            np.ndarray: The sorted doc IDs
+        """
+
+        term_id = self.terms.get_id(term)
+
+        if term_id is None or not self.terms.has_field(term_id, field):
+            return np.empty(0, dtype=np.int32)
+
+        return self.postings.get(field, term_id)
+
+    @property
+    def references(self) -> int:
+        return self._references
+
+    @property
+    def retired(self) -> bool:
+        return self._retired
+
+    def acquire(self):
+        """
+        Registers a new query running on the snapshot.
+        """
+
+        with self._lock:
+            self._references += 1
+
+    def release(self):
+        """
+        Unregisters a query running on the snapshot.
+        """
+
+        with self._lock:
+            self._references -= 1
+
+            if self._retired and self._references == 0:
+                self._drained.set()
+
+    def retire(self):
+        """
+        Marks the snapshot as replaced by a newer version. No new
+        query will start on it.
+        """
+
+        with self._lock:
+            self._retired = True
+
+            if self._references == 0:
+                self._drained.set()
+
+    def wait_until_drained(self, timeout: float = None) -> bool:
+        """
+        Waits until all the queries running on a retired snapshot
+        are over.
+
+        Args:
+            timeout (float): Maximum waiting time in seconds
+
+        Returns:
+            bool: True if the snapshot is no longer used
+        """
+
+        return self._drained.wait(timeout=timeout)
+
+
+@instrumentation.timed("tp3_load_seconds")
+def load_snapshot(
+    input_dir: str,
+    version: int,
+    static_weights: dict = None
+) -> IndexSnapshot:
+    """
+    Reads all the indexes of a directory into a snapshot.
+
+    Args:
+        input_dir (str): The directory containing the indexes
+
+        version (int): The version number of the snapshot
+
+        static_weights (dict): The weight of each static feature
+            (see static_features.get_static_scores)
+
+    Returns:
+        IndexSnapshot: The loaded snapshot
+    """
+
+    # The signature is taken before reading, so that a rebuild happening
+    # while we read is detected on the next refresh
+    signature = get_index_signature(input_dir)
+
+    indexes = {}
+
+    for name, file_name in INDEX_FILES.items():
+        with open(os.path.join(input_dir, file_name), "r", encoding="utf-8") as f:
+            indexes[name] = json.load(f)
+
+    for name, file_name in OPTIONAL_INDEX_FILES.items():
+        path = os.path.join(input_dir, file_name)
+        if not os.path.exists(path):
+            continue
+
+        if name == "autocomplete":
+            # Memory-mapped: TP2 replaces the file instead of rewriting
+            # it, so this version stays readable after a rebuild
+            indexes[name] = Autocomplete(path)
+        elif name == "review_stats":
+            indexes[name] = ReviewStats.load(path)
+        elif name == "term_dictionary":
+            indexes[name] = load_term_dictionary(path)
+        elif file_name.endswith(".npz"):
+            indexes[name] = load_ann_index(path)
+        else:
+            with open(path, "r", encoding="utf-8") as f:
+                indexes[name] = json.load(f)
+
+    return IndexSnapshot(
+        indexes=indexes,
+        version=version,
+        signature=signature,
+        static_weights=static_weights
+    )
+
+
+class Searcher:
+    """
+    Holds the current snapshot of the indexes and swaps it when the
+    indexes are rebuilt, without stopping the queries in progress.
+    """
+
+    def __init__(
+        self,
+        input_dir: str = "TP3/input",
+        static_weights: dict = None
+    ):
+        """
+        Args:
+            input_dir (str): The directory containing the indexes
+
+            static_weights (dict): The weight of each static feature
+                (by default static_features.DEFAULT_WEIGHTS)
+        """
+
+        self.input_dir = input_dir
+        self.static_weights = static_weights
+        self.review_log = None
+        self.last_error = None
+
+        self._lock = threading.Lock()
+        self._reload_lock = threading.Lock()
+        self._rerank_lock = threading.Lock()
+        self._snapshot = load_snapshot(
+            input_dir=input_dir,
+            version=1,
+            static_weights=static_weights
+        )
+
+    @property
+    def version(self) -> int:
+        return self._snapshot.version
+
+    @contextmanager
+    def snapshot(self):
+        """
+        Gives the current snapshot for the duration of a query. The
+        snapshot stays valid even if a new version is swapped in.
+
+        Yields:
+            IndexSnapshot: The current snapshot
+        """
+
+        # Reading and acquiring must be atomic regarding the swap
+        with self._lock:
+            snapshot = self._snapshot
+            snapshot.acquire()
+
+        try:
+            yield snapshot
+        finally:
+            snapshot.release()
+
+    def swap(self, snapshot: IndexSnapshot) -> IndexSnapshot:
+        """
+        Replaces the current snapshot by a new one.
+
+        Args:
+            snapshot (IndexSnapshot): The new snapshot
+
+        Returns:
+            IndexSnapshot: The old snapshot, retired
+        """
+
+        with self._lock:
+            old_snapshot = self._snapshot
+            self._snapshot = snapshot
+
+        old_snapshot.retire()
+
+        return old_snapshot
+
+    def _load_and_swap(self, input_dir: str):
+
+        # Only one reload at a time, so that versions are increasing
+        with self._reload_lock:
+            try:
+                snapshot = load_snapshot(
+                    input_dir=input_dir,
+                    version=self._snapshot.version + 1,
+                    static_weights=self.static_weights
+                )
+
+                # The reviews received since the indexes were built
+                if self.review_log is not None:
+                    snapshot.update_from_review_log(self.review_log)
+                    if len(snapshot.updated_doc_ids) >= RERANK_THRESHOLD:
+                        snapshot.rerank()
+
+            except Exception as error:
+                # A missing, truncated or malformed index (e.g. a list
+                # instead of a dict raises a TypeError): we keep serving
+                # the old snapshot
+                self.last_error = error
+                instrumentation.count("tp3_index_reload_errors_total")
+                return
+
+            self.input_dir = input_dir
+            self.last_error = None
+            self.swap(snapshot=snapshot)
+
+            instrumentation.count("tp3_index_swaps_total")
+
+    def update_from_review_log(self, path: str = None) -> int:
+        """
+        Updates the static scores of the current snapshot with the
+        reviews appended to a review log. The log is read again by
+        the snapshots loaded later, from where their aggregates were
+        saved. Once RERANK_THRESHOLD documents are updated, the impact
+        index is ordered again in the background (see rerank).
+
+        Args:
+            path (str): The path of the log (by default the last one
+                given)
+
+        Returns:
+            int: The number of documents whose score changed
+        """
+
+        self.review_log = path or self.review_log
+
+        with self.snapshot() as snapshot:
+            updated = snapshot.update_from_review_log(self.review_log)
+            n_updates = len(snapshot.updated_doc_ids)
+
+        instrumentation.count("tp3_review_updates_total", updated)
+
+        if n_updates >= RERANK_THRESHOLD:
+            self.rerank()
+
+        return updated
+
+    def _rerank(self):
+
+        # A single ordering at a time, the next call takes the reviews
+        # received meanwhile
+        if not self._rerank_lock.acquire(blocking=False):
+            return
+
+        try:
+            with self.snapshot() as snapshot:
+                snapshot.rerank()
+
+            instrumentation.count("tp3_reranks_total")
+
+        finally:
+            self._rerank_lock.release()
+
+    def rerank(self) -> threading.Thread:
+        """
+        Orders the impact index of the current snapshot again by the
+        current static scores, in the background. The queries in
+        progress keep the previous order.
+
+        Returns:
+            threading.Thread: The thread ordering the index
+        """
+
+        thread = threading.Thread(target=self._rerank, daemon=True)
+        thread.start()
+
+        return thread
+
+    def reload(self, input_dir: str = None) -> threading.Thread:
+        """
+        Loads a new version of the indexes in the background and
+        swaps it in once it is ready.
+
+        Args:
+            input_dir (str): The directory containing the new indexes
+                (by default the current one)
+
+        Returns:
+            threading.Thread: The thread loading the indexes
+        """
+
+        thread = threading.Thread(
+            target=self._load_and_swap,
+            args=(input_dir or self.input_dir,),
+            daemon=True
+        )
+        thread.start()
+
+        return thread
+
+    def reload_if_changed(self) -> threading.Thread | None:
+        """
+        Reloads the indexes if their files have been modified since
+        the current snapshot was loaded.
+
+        Returns:
+            threading.Thread | None: The reloading thread, if any
+        """
+
+        try:
+            signature = get_index_signature(self.input_dir)
+        except OSError as error:
+            self.last_error = error
+            return None
+
+        if signature == self._snapshot.signature:
+            return None
+
+        return self.reload()
@@ -0,0 +1,224 @@
+import math
+import os
+import sys
+
+import numpy as np
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from common.review_stats import ReviewStats  # noqa: E402
+
+
+# The weight of each static feature in the score of a document. The
+# default ones give the score of the first version of the ranking
+# (mean mark + last rating) plus the PageRank.
+DEFAULT_WEIGHTS = {
+    "review_mean": 1,
+    "last_rating": 1,
+    "static_rank": 2,
+}
+
+# Number of fictive reviews, rated as the mean of the catalog, added
+# to each document by the Bayesian average
+PRIOR_COUNT = 5
+
+# Number of days after which the recency of the last review is halved
+HALF_LIFE_DAYS = 180
+
+
+def get_review_arrays(aggregates: dict, reference: int) -> dict:
+    """
+    Gives the statistics of the reviews used by the features.
+
+    Args:
+        aggregates (dict): The arrays of ReviewStats.get_arrays
+
+        reference (int): The day ordinal from which the age of the
+            last review is counted
+
+    Returns:
+        dict: {
+            "count": np.ndarray,
+            "mean": np.ndarray,
+            "last": np.ndarray,
+            "decayed_mean": np.ndarray,
+            "age": np.ndarray (days, NaN without date)
+        }
+    """
+
+    count = aggregates["count"].astype(np.float64)
+    weight = aggregates["decayed_weight"]
+    last_date = aggregates["last_date"]
+
+    return {
+        "count": count,
+        "mean": np.divide(
+            aggregates["sum"], count, out=np.zeros_like(count), where=count > 0
+        ),
+        "last": aggregates["last"],
+        "decayed_mean": np.divide(
+            aggregates["decayed_sum"], weight,
+            out=np.zeros_like(count), where=weight > 0
+        ),
+        # Reviews received after the load are as recent as possible
+        "age": np.where(
+            last_date > 0, np.maximum(reference - last_date, 0), np.nan
+        ),
+    }
+
+
+def get_review_mean(reviews: dict, **_) -> np.ndarray:
+    return reviews["mean"]
+
+
+def get_last_rating(reviews: dict, **_) -> np.ndarray:
+    return reviews["last"]
+
+
+def get_decayed_mean(reviews: dict, **_) -> np.ndarray:
+    return reviews["decayed_mean"]
+
+
+def get_bayesian_average(
+    reviews: dict,
+    prior_mean: float,
+    prior_count: float = PRIOR_COUNT,
+    **_
+) -> np.ndarray:
+    """
+    The mean rating pulled towards the mean of the catalog, the more
+    so the fewer reviews the document has: a single 5 no longer beats
+    a hundred reviews averaging 4.8.
+    """
+
+    count = reviews["count"]
+
+    return (
+        (prior_count * prior_mean + reviews["mean"] * count)
+        / (prior_count + count)
+    )
+
+
+def get_recency(
+    reviews: dict,
+    half_life_days: float = HALF_LIFE_DAYS,
+    **_
+) -> np.ndarray:
+    """
+    Between 1 for the document reviewed last and 0 for the ones
+    without a dated review.
+    """
+
+    age = reviews["age"]
+
+    return np.where(
+        np.isnan(age), 0, np.exp(-math.log(2) * np.nan_to_num(age) / half_life_days)
+    )
+
+
+def get_static_rank(static_rank: np.ndarray, **_) -> np.ndarray:
+    return static_rank
+
+
+FEATURES = {
+    "review_mean": get_review_mean,
+    "last_rating": get_last_rating,
+    "decayed_mean": get_decayed_mean,
+    "bayesian_average": get_bayesian_average,
+    "recency": get_recency,
+    "static_rank": get_static_rank,
+}
+
+
+class StaticScorer:
+    """
+    Computes the part of the score which does not depend on the
+    query, as a weighted sum of static features, for all the
+    documents at load time, then for the documents receiving new
+    reviews.
+    """
+
+    def __init__(
+        self,
+        review_stats: ReviewStats,
+        urls: tuple,
+        static_rank: np.ndarray,
+        weights: dict = None,
+        **parameters
+    ):
+        """
+        Args:
+            review_stats (ReviewStats): The aggregates of the reviews
+
+            urls (tuple): The URL of each doc ID
+
+            static_rank (np.ndarray): The PageRank of each doc ID,
+                scaled between 0 and 1
+
+            weights (dict): The weight of each feature of FEATURES (by
+                default DEFAULT_WEIGHTS)
+
+            **parameters: The parameters of the features (prior_count,
+                half_life_days)
+        """
+
+        self.weights = DEFAULT_WEIGHTS if weights is None else weights
+
+        unknown = set(self.weights) - set(FEATURES)
+        if unknown:
+            raise ValueError(f"Unknown static features: {sorted(unknown)}")
+
+        self.review_stats = review_stats
+        self.urls = urls
+        self.static_rank = static_rank
+        self.slots = np.array(
+            [review_stats.slots.get(url, -1) for url in urls], dtype=np.int64
+        )
+
+        # The values depending on the whole catalog are fixed at load
+        # time, so that a new review only changes its document
+        aggregates = review_stats.get_arrays(self.slots)
+        total = aggregates["count"].sum()
+        self.parameters = {
+            "prior_mean": aggregates["sum"].sum() / total if total else 0,
+            **parameters,
+        }
+        self.reference = int(aggregates["last_date"].max(initial=0))
+
+    def get_scores(self, doc_ids: np.ndarray = None) -> np.ndarray:
+        """
+        Gives the static score of some documents.
+
+        Args:
+            doc_ids (np.ndarray): The doc IDs (all of them by default)
+
+        Returns:
+            np.ndarray: The static scores
+        """
+
+        if doc_ids is not None:
+            # A document without reviews at load time gets a slot with
+            # its first review
+            for doc_id in doc_ids[self.slots[doc_ids] < 0].tolist():
+                self.slots[doc_id] = self.review_stats.slots.get(
+                    self.urls[doc_id], -1
+                )
+
+        slots = self.slots if doc_ids is None else self.slots[doc_ids]
+        static_rank = (
+            self.static_rank if doc_ids is None else self.static_rank[doc_ids]
+        )
+
+        reviews = get_review_arrays(
+            aggregates=self.review_stats.get_arrays(slots),
+            reference=self.reference
+        )
+        scores = np.zeros(len(slots), dtype=np.float64)
+
+        for name, weight in self.weights.items():
+            if weight:
+                scores += weight * FEATURES[name](
+                    reviews=reviews, static_rank=static_rank, **self.parameters
+                )
+
+        return scores
@@ -0,0 +1,212 @@
+import argparse
+import json
+import os
+import random
+import sys
+import tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+for folder in ("TP1/src", "TP2", "TP3"):
+    sys.path.append(os.path.join(ROOT, folder))
+
+from generator import generate_catalog  # noqa: E402
+from run import QUERIES, build_indexes, save_indexes  # noqa: E402
+
+
+# Multi-word queries (words which never appear together, several
+# fields) and typos, on top of the queries of the benchmark
+CHECKED_QUERIES = QUERIES + [
+    "small medium", "potion hoodie", "red blue green", "chocolat",
+    "enegry drink", "energy drink for a gift", "box", "usa"
+]
+
+CHECKED_FILTERS = [
+    None, "origin=usa", "brand=chocodelight", "origin=japan|italy",
+    "NOT origin=usa", "origin=usa AND NOT brand=chocodelight",
+    "origin=usa AND origin=japan"
+]
+
+CHECKED_K = [1, 10, 100]
+
+# Relative difference accepted between two scores (sums made in a
+# different order)
+TOLERANCE = 1e-9
+
+
+def is_close(first: float, second: float) -> bool:
+    return abs(first - second) <= TOLERANCE * max(1, abs(first), abs(second))
+
+
+def compare(query: str, documents: list, snapshot, k: int, filters: str) -> str:
+    """
+    Compares the k best documents of get_top_k_scores with the
+    ones of get_score_for_all_url.
+
+    Args:
+        query (str): The query
+
+        documents (list): All the documents of the snapshot
+
+        snapshot (IndexSnapshot): The indexes
+
+        k (int): The number of documents
+
+        filters (str): The facet filters
+
+    Returns:
+        str: The description of the difference, None if there is none
+    """
+
+    import TP3
+
+    all_scores = TP3.get_score_for_all_url(
+        query, documents, snapshot, filters=filters
+    )
+    expected = sorted(all_scores.values(), reverse=True)[:k]
+
+    top_k = TP3.get_top_k_scores(query, snapshot, k=k, filters=filters)
+    found = list(top_k.values())
+
+    if len(found) != len(expected) or not all(
+        is_close(a, b) for a, b in zip(found, expected)
+    ):
+        return f"scores {found[:5]} instead of {expected[:5]}"
+
+    # Between equal scores the documents may differ, but each of them
+    # must have the score given by the exhaustive ranking
+    for url, score in top_k.items():
+        if url not in all_scores or not is_close(score, all_scores[url]):
+            return f"{url} scored {score} instead of {all_scores.get(url)}"
+
+    return None
+
+
+def check_snapshot(snapshot, documents: list) -> list[str]:
+    """
+    Compares the two rankings for all the checked queries, filters
+    and numbers of documents.
+
+    Args:
+        snapshot (IndexSnapshot): The indexes
+
+        documents (list): All the documents of the snapshot
+
+    Returns:
+        list[str]: The description of each difference
+    """
+
+    differences = []
+
+    for query in CHECKED_QUERIES:
+        for filters in CHECKED_FILTERS:
+            for k in CHECKED_K:
+                difference = compare(query, documents, snapshot, k, filters)
+                if difference:
+                    differences.append(
+                        f"{query!r} k={k} filters={filters!r}: {difference}"
+                    )
+
+    return differences
+
+
+def add_random_reviews(snapshot, documents: list, n_reviews: int, seed: int):
+    """
+    Gives new reviews to random documents, the way the review log
+    does after the indexes are loaded.
+    """
+
+    rng = random.Random(seed)
+
+    snapshot.add_reviews([
+        {
+            "url": rng.choice(documents)["url"],
+            "rating": rng.choice([1, 5]),
+            "date": f"2030-01-{rng.randrange(1, 29):02d}",
+        }
+        for _ in range(n_reviews)
+    ])
+
+
+def check(input_dir: str, documents: list, n_reviews: int, seed: int) -> list[str]:
+    """
+    Checks the indexes of a directory, before and after new reviews,
+    and once the impact index is ordered by the new static scores.
+
+    Args:
+        input_dir (str): The directory of the indexes
+
+        documents (list): All the documents
+
+        n_reviews (int): The number of reviews added
+
+        seed (int): The seed of the reviews
+
+    Returns:
+        list[str]: The description of each difference
+    """
+
+    from searcher import load_snapshot
+
+    snapshot = load_snapshot(input_dir=input_dir, version=1)
+
+    differences = check_snapshot(snapshot, documents)
+
+    add_random_reviews(snapshot, documents, n_reviews, seed)
+    differences += [
+        f"after reviews: {difference}"
+        for difference in check_snapshot(snapshot, documents)
+    ]
+
+    snapshot.rerank()
+    differences += [
+        f"after rerank: {difference}"
+        for difference in check_snapshot(snapshot, documents)
+    ]
+
+    return differences
+
+
+def main() -> int:
+
+    parser = argparse.ArgumentParser(
+        description="Checks that the top k search gives the k best "
+        "documents of the exhaustive ranking"
+    )
+    parser.add_argument("--sizes", type=int, nargs="+", default=[5000])
+    parser.add_argument("--reviews", type=int, default=200)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    results = {}
+
+    # The indexes of the crawled products
+    with open(
+        os.path.join(ROOT, "TP3/rearranged_products.jsonl"), "r", encoding="utf-8"
+    ) as f:
+        documents = [json.loads(line) for line in f]
+    results["TP3/input"] = check(
+        os.path.join(ROOT, "TP3/input"), documents, args.reviews, args.seed
+    )
+
+    for size in args.sizes:
+        documents = list(generate_catalog(n_docs=size, seed=args.seed))
+
+        with tempfile.TemporaryDirectory() as index_dir:
+            save_indexes(build_indexes(documents), index_dir)
+            results[f"catalog@{size}"] = check(
+                index_dir, documents, args.reviews, args.seed
+            )
+
+    n_checks = len(CHECKED_QUERIES) * len(CHECKED_FILTERS) * len(CHECKED_K) * 3
+
+    for name, differences in results.items():
+        print(f"{name}: {n_checks - len(differences)}/{n_checks} identical")
+        for difference in differences:
+            print(f"DIFFERENCE {name} {difference}")
+
+    return 1 if any(results.values()) else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,331 @@
+import json
+import random
+import datetime
+
+
+# Vocabulary used to build the synthetic products. The words are close
+# to the ones of web-scraping.dev so that tokenization behaves the same.
+
+CATEGORIES = {
+    "consumables": {
+        "nouns": [
+            "chocolate", "candy", "energy drink", "potion", "tea", "coffee",
+            "cookies", "gummies", "snack bar", "juice"
+        ],
+        "materials": [
+            "premium quality chocolate", "natural ingredients",
+            "organic cocoa", "sparkling water", "roasted beans"
+        ],
+    },
+    "apparel": {
+        "nouns": [
+            "sneakers", "boots", "hat", "beanie", "socks", "jacket", "hoodie",
+            "t-shirt", "scarf", "gloves"
+        ],
+        "materials": [
+            "cotton", "leather", "wool", "polyester", "recycled fibers"
+        ],
+    },
+    "household": {
+        "nouns": [
+            "mug", "lamp", "cushion", "candle", "blanket", "kettle", "vase",
+            "clock", "planter", "towel"
+        ],
+        "materials": [
+            "ceramic", "glass", "bamboo", "stainless steel", "linen"
+        ],
+    },
+}
+
+ADJECTIVES = [
+    "dark", "red", "blue", "green", "classic", "retro", "cozy", "sweet",
+    "spicy", "fresh", "premium", "handmade", "lightweight", "vintage",
+    "organic", "sparkling", "smooth", "bold", "mini", "deluxe"
+]
+
+FLAVORS = ["orange", "cherry", "mint", "vanilla", "berry", "lemon"]
+
+SIZES = ["small", "medium", "large"]
+
+BRANDS = [
+    "ChocoDelight", "GameBeast", "HighStride", "SleekSneakers",
+    "WebScrapingDev", "NordicHome", "UrbanWear", "PureLeaf", "SunnyBrew",
+    "CraftCorner", "PeakGear", "MoonRoast"
+]
+
+ORIGINS = [
+    "usa", "france", "spain", "germany", "south korea", "switzerland",
+    "netherlands", "brazil", "italy", "japan", "canada", "mexico"
+]
+
+SENTENCES = [
+    "Indulge yourself with our {adjective} {noun}.",
+    "Each {noun} is made with {material} for a {adjective} experience.",
+    "Whether you are looking for the perfect gift or just want to treat "
+    "yourself, our {noun} is sure to satisfy.",
+    "Available in {flavor} and {size} versions.",
+    "Our {brand} {noun} has been loved by customers since {year}.",
+    "Designed for everyday use, it combines {material} and a {adjective} "
+    "look.",
+    "Perfect for {occasion}, this {noun} will quickly become a favorite.",
+]
+
+OCCASIONS = [
+    "gaming sessions", "long hikes", "cold evenings", "the office",
+    "family dinners", "parties", "travel"
+]
+
+REVIEW_TEXTS = [
+    "Absolutely delicious!", "Great value for the price.",
+    "Would definitely purchase again.", "Not what I expected.",
+    "The {flavor} version is my favorite.", "Arrived quickly and well packed.",
+    "Quality could be better.", "I bought it as a gift, well received."
+]
+
+
+def get_random(seed: int, doc_id: int) -> random.Random:
+    """
+    Gives the random generator of a document, so that any document
+    can be generated again on its own.
+
+    Args:
+        seed (int): The seed of the catalog
+
+        doc_id (int): The id of the document
+
+    Returns:
+        random.Random: The random generator
+    """
+
+    return random.Random(f"{seed}-{doc_id}")
+
+
+def get_url(base_url: str, doc_id: int) -> str:
+    """
+    Gives the URL of a synthetic product.
+
+    Args:
+        base_url (str): The base URL of the site
+
+        doc_id (int): The id of the document
+
+    Returns:
+        str: The URL
+    """
+
+    return f"{base_url}/product/{doc_id}"
+
+
+def get_popular_doc_id(rng: random.Random, n_docs: int) -> int:
+    """
+    Draws a document id, the first documents being much more
+    likely than the last ones (as for popular products).
+
+    Args:
+        rng (random.Random): The random generator
+
+        n_docs (int): The number of documents of the catalog
+
+    Returns:
+        int: The document id
+    """
+
+    return int(n_docs * rng.random() ** 3)
+
+
+def generate_links(
+    rng: random.Random,
+    doc_id: int,
+    n_docs: int,
+    base_url: str,
+    n_links: int = 10
+) -> list[str]:
+    """
+    Generates the links of a product page: the navigation of the site
+    and links to other products.
+
+    Args:
+        rng (random.Random): The random generator
+
+        doc_id (int): The id of the document
+
+        n_docs (int): The number of documents of the catalog
+
+        base_url (str): The base URL of the site
+
+        n_links (int): The number of links to other products
+
+    Returns:
+        list[str]: The links
+    """
+
+    links = [
+        f"{base_url}/",
+        f"{base_url}/products",
+        f"{base_url}/products?page={doc_id // 20 + 1}",
+    ]
+
+    # A "next product" link ensures every product can be reached
+    links.append(get_url(base_url, (doc_id + 1) % n_docs))
+
+    for _ in range(n_links):
+        links.append(get_url(base_url, get_popular_doc_id(rng, n_docs)))
+
+    return links
+
+
+def generate_reviews(rng: random.Random, doc_id: int, flavor: str) -> list:
+    """
+    Generates the reviews of a product.
+
+    Args:
+        rng (random.Random): The random generator
+
+        doc_id (int): The id of the document
+
+        flavor (str): The flavor used in the texts
+
+    Returns:
+        list: The reviews, from the oldest to the most recent
+    """
+
+    reviews = []
+    date = datetime.date(2022, 1, 1) + datetime.timedelta(rng.randrange(365))
+
+    for i in range(rng.choice([0, 3, 4, 5, 5, 5, 6, 8])):
+        date += datetime.timedelta(days=rng.randrange(1, 60))
+        reviews.append({
+            "date": date.isoformat(),
+            "id": f"product-{doc_id}-{i + 1}",
+            "rating": rng.choices([1, 2, 3, 4, 5], weights=[1, 1, 2, 5, 8])[0],
+            "text": rng.choice(REVIEW_TEXTS).format(flavor=flavor),
+        })
+
+    return reviews
+
+
+def generate_document(
+    doc_id: int,
+    n_docs: int,
+    seed: int = 0,
+    base_url: str = "https://web-scraping.dev"
+) -> dict:
+    """
+    Generates a synthetic product with the same fields as the
+    output of the crawler used in TP2.
+
+    Args:
+        doc_id (int): The id of the document
+
+        n_docs (int): The number of documents of the catalog
+
+        seed (int): The seed of the catalog
+
+        base_url (str): The base URL of the site
+
+    Returns:
+        dict: {
+            "url": str,
+            "title": str,
+            "description": str,
+            "product_features": dict,
+            "links": list[str],
+            "product_reviews": list[dict]
+        }
+    """
+
+    rng = get_random(seed, doc_id)
+
+    category = rng.choice(list(CATEGORIES))
+    noun = rng.choice(CATEGORIES[category]["nouns"])
+    material = rng.choice(CATEGORIES[category]["materials"])
+    adjective = rng.choice(ADJECTIVES)
+    brand = rng.choice(BRANDS)
+    flavor = rng.choice(FLAVORS)
+    size = rng.choice(SIZES)
+
+    title = f"{adjective} {noun}".title()
+    if rng.random() < 0.3:
+        title += f" {size.title()}"
+
+    words = {
+        "adjective": adjective, "noun": noun, "material": material,
+        "flavor": flavor, "size": size, "brand": brand,
+        "year": rng.randrange(1990, 2024), "occasion": rng.choice(OCCASIONS)
+    }
+    description = " ".join(
+        sentence.format(**words)
+        for sentence in rng.sample(SENTENCES, k=rng.randrange(2, 5))
+    )
+
+    product_features = {
+        "material": material.capitalize(),
+        "brand": brand,
+        "purpose": f"Ideal for {words['occasion']}",
+    }
+    if category == "consumables":
+        product_features["flavors"] = f"Available in {flavor.title()} flavor"
+    if rng.random() < 0.9:
+        product_features["made in"] = rng.choice(ORIGINS)
+
+    return {
+        "url": get_url(base_url, doc_id),
+        "title": title,
+        "description": description,
+        "product_features": product_features,
+        "links": generate_links(rng, doc_id, n_docs, base_url),
+        "product_reviews": generate_reviews(rng, doc_id, flavor),
+    }
+
+
+def generate_catalog(
+    n_docs: int,
+    seed: int = 0,
+    base_url: str = "https://web-scraping.dev"
+):
+    """
+    Generates a synthetic catalog, one document at a time so that
+    very large catalogs do not need to fit in memory.
+
+    Args:
+        n_docs (int): The number of documents
+
+        seed (int): The seed of the catalog
+
+        base_url (str): The base URL of the site
+
+    Yields:
+        dict: The documents
+    """
+
+    for doc_id in range(n_docs):
+        yield generate_document(
+            doc_id=doc_id,
+            n_docs=n_docs,
+            seed=seed,
+            base_url=base_url
+        )
+
+
+def write_catalog(
+    path: str,
+    n_docs: int,
+    seed: int = 0,
+    base_url: str = "https://web-scraping.dev"
+):
+    """
+    Writes a synthetic catalog in a jsonl file.
+
+    Args:
+        path (str): The path of the jsonl file
+
+        n_docs (int): The number of documents
+
+        seed (int): The seed of the catalog
+
+        base_url (str): The base URL of the site
+    """
+
+    with open(path, "w", encoding="utf-8") as f:
+        for document in generate_catalog(n_docs, seed, base_url):
+            f.write(json.dumps(document, ensure_ascii=False) + "\n")
@@ -0,0 +1,181 @@
+import html
+import json
+import re
+import threading
+import urllib.parse
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from generator import generate_document, get_url
+
+
+PRODUCTS_PER_PAGE = 20
+
+
+def render_product(document: dict) -> str:
+    """
+    Renders a synthetic product as an HTML page close to the ones
+    of web-scraping.dev.
+
+    Args:
+        document (dict): The document
+
+    Returns:
+        str: The HTML page
+    """
+
+    features = "".join(
+        f"<tr class=\"feature\"><td class=\"feature-label\">"
+        f"{html.escape(name)}</td>"
+        f"<td class=\"feature-value\">{html.escape(value)}</td></tr>"
+        for name, value in document["product_features"].items()
+    )
+    # As on web-scraping.dev, the reviews are given as json and
+    # rendered by a script
+    reviews = json.dumps(document["product_reviews"]).replace("</", "<\\/")
+    links = "".join(
+        f"<a href=\"{html.escape(link)}\">{html.escape(link)}</a>"
+        for link in document["links"]
+    )
+
+    return (
+        "<!DOCTYPE html><html><head>"
+        f"<title>{html.escape(document['title'])}</title>"
+        "</head><body>"
+        f"<nav>{links}</nav>"
+        f"<h3 class=\"product-title\">{html.escape(document['title'])}</h3>"
+        f"<p class=\"product-description\">"
+        f"{html.escape(document['description'])}</p>"
+        f"<table class=\"product-features\">{features}</table>"
+        f"<div id=\"reviews\"></div>"
+        f"<script id=\"reviews-data\" type=\"application/json\">"
+        f"{reviews}</script>"
+        "</body></html>"
+    )
+
+
+def render_listing(base_url: str, page: int, n_docs: int) -> str:
+    """
+    Renders a page listing some products.
+
+    Args:
+        base_url (str): The base URL of the site
+
+        page (int): The number of the page (starting at 1)
+
+        n_docs (int): The number of documents of the catalog
+
+    Returns:
+        str: The HTML page
+    """
+
+    first = (page - 1) * PRODUCTS_PER_PAGE
+    last = min(first + PRODUCTS_PER_PAGE, n_docs)
+    n_pages = (n_docs - 1) // PRODUCTS_PER_PAGE + 1
+
+    products = "".join(
+        f"<a href=\"{get_url(base_url, doc_id)}\">product {doc_id}</a>"
+        for doc_id in range(first, last)
+    )
+    pages = "".join(
+        f"<a href=\"{base_url}/products?page={number}\">{number}</a>"
+        for number in range(max(1, page - 2), min(n_pages, page + 2) + 1)
+    )
+
+    return (
+        "<!DOCTYPE html><html><head>"
+        f"<title>product page {page}</title>"
+        "</head><body>"
+        "<p>Synthetic catalog used for the benchmarks.</p>"
+        f"{products}{pages}"
+        "</body></html>"
+    )
+
+
+def create_handler(n_docs: int, seed: int):
+    """
+    Creates the request handler of the site.
+
+    Args:
+        n_docs (int): The number of documents of the catalog
+
+        seed (int): The seed of the catalog
+
+    Returns:
+        type: The handler class
+    """
+
+    class CatalogHandler(BaseHTTPRequestHandler):
+
+        def get_base_url(self) -> str:
+            host, port = self.server.server_address[:2]
+            return f"http://{host}:{port}"
+
+        def send_page(self, body: str, content_type: str = "text/html"):
+            content = body.encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", f"{content_type}; charset=utf-8")
+            self.send_header("Content-Length", str(len(content)))
+            self.end_headers()
+            self.wfile.write(content)
+
+        def do_GET(self):
+            base_url = self.get_base_url()
+            parsed_url = urllib.parse.urlparse(self.path)
+            query = urllib.parse.parse_qs(parsed_url.query)
+
+            match = re.fullmatch(r"/product/(\d+)", parsed_url.path)
+
+            if match and int(match.group(1)) < n_docs:
+                document = generate_document(
+                    doc_id=int(match.group(1)),
+                    n_docs=n_docs,
+                    seed=seed,
+                    base_url=base_url
+                )
+                self.send_page(render_product(document))
+
+            elif parsed_url.path in ("/", "/products"):
+                page = int(query.get("page", ["1"])[0])
+                self.send_page(render_listing(base_url, page, n_docs))
+
+            elif parsed_url.path == "/robots.txt":
+                self.send_page("User-agent: *\nAllow: /\n", "text/plain")
+
+            else:
+                self.send_error(404)
+
+        def log_message(self, format, *args):
+            # The benchmarks would be slowed down by the logs
+            pass
+
+    return CatalogHandler
+
+
+def start_site(n_docs: int, seed: int = 0, port: int = 0):
+    """
+    Starts a local site serving a synthetic catalog, used as a
+    stand-in for web-scraping.dev in the crawl benchmarks.
+
+    Args:
+        n_docs (int): The number of documents of the catalog
+
+        seed (int): The seed of the catalog
+
+        port (int): The port of the site (0 for any free port)
+
+    Returns:
+        tuple[ThreadingHTTPServer, str]: The server and its base URL
+    """
+
+    server = ThreadingHTTPServer(
+        ("127.0.0.1", port),
+        create_handler(n_docs=n_docs, seed=seed)
+    )
+    server.daemon_threads = True
+
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+
+    host, port = server.server_address[:2]
+
+    return server, f"http://{host}:{port}"
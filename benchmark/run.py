@@ -0,0 +1,560 @@
+import argparse
+import json
+import os
+import platform
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+for folder in ("TP1/src", "TP2", "TP3"):
+    sys.path.append(os.path.join(ROOT, folder))
+
+from generator import generate_catalog  # noqa: E402
+from local_site import start_site  # noqa: E402
+
+
+STAGES = ["crawl", "build", "load", "query", "top_k"]
+
+QUERIES = [
+    "chocolate", "energy drink", "dark chocolate box", "leather boots usa",
+    "cozy blanket", "gift", "sweet cherry candy", "sneakers"
+]
+
+# Metrics for which a higher value is a regression
+COMPARED_METRICS = ["seconds", "p95_ms", "peak_memory_mb"]
+
+
+def measure(function, repeats: int) -> tuple[list[float], object]:
+    """
+    Measures the execution time of a function.
+
+    Args:
+        function (callable): The function, without arguments
+
+        repeats (int): The number of runs
+
+    Returns:
+        tuple[list[float], object]: The times in seconds and the
+            result of the last run
+    """
+
+    times = []
+
+    for _ in range(repeats):
+        start = time.perf_counter()
+        result = function()
+        times.append(time.perf_counter() - start)
+
+    return times, result
+
+
+def measure_memory(function) -> float:
+    """
+    Measures the peak memory allocated by a function. It is done
+    in a separate run since tracing slows down the execution.
+
+    Args:
+        function (callable): The function, without arguments
+
+    Returns:
+        float: The peak memory in MB
+    """
+
+    tracemalloc.start()
+    try:
+        function()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    return peak / 1024 ** 2
+
+
+def get_metrics(times: list[float], n_items: int, memory: float) -> dict:
+    """
+    Summarizes the measures of a stage.
+
+    Args:
+        times (list[float]): The times in seconds
+
+        n_items (int): The number of items handled by one run
+
+        memory (float): The peak memory in MB (None if not measured)
+
+    Returns:
+        dict: The metrics
+    """
+
+    seconds = statistics.median(times)
+
+    metrics = {
+        "seconds": seconds,
+        "items_per_second": n_items / seconds if seconds else None,
+        "runs": len(times),
+    }
+
+    if memory is not None:
+        metrics["peak_memory_mb"] = memory
+
+    return metrics
+
+
+def benchmark_crawl(size: int, repeats: int, with_memory: bool) -> dict:
+    """
+    Crawls a local synthetic site of a given size.
+
+    Args:
+        size (int): The number of pages to crawl
+
+        repeats (int): The number of runs
+
+        with_memory (bool): Whether the peak memory is measured
+
+    Returns:
+        dict: The metrics
+    """
+
+    import TP
+
+    # The site is local, politeness is not needed
+    TP.DELAY = 0
+
+    server, base_url = start_site(n_docs=size)
+
+    def run():
+        return TP.crawler(f"{base_url}/product/0", max_pages=size)
+
+    try:
+        times, _ = measure(run, repeats)
+        memory = measure_memory(run) if with_memory else None
+    finally:
+        server.shutdown()
+
+    return get_metrics(times, size, memory)
+
+
+def build_indexes(documents: list) -> dict:
+    """
+    Builds all the indexes of TP2, as its main block does.
+
+    Args:
+        documents (list): The documents
+
+    Returns:
+        dict: The indexes
+    """
+
+    import TP2
+
+    indexes = {
+        "title_index": TP2.create_inverted_index_for_title(documents),
+        "description_index":
+            TP2.create_inverted_index_for_description(documents),
+        "review_stats": TP2.create_review_stats(documents),
+        "origin_index": TP2.create_index_origin(documents),
+        "brand_index": TP2.create_index_brand(documents),
+    }
+    indexes["reviews_index"] = TP2.create_index_reviews(
+        documents, review_stats=indexes["review_stats"]
+    )
+
+    indexes["fuzzy_index"] = TP2.create_index_fuzzy([
+        indexes["title_index"], indexes["description_index"],
+        indexes["origin_index"], indexes["brand_index"]
+    ])
+    indexes["autocomplete"] = TP2.create_index_autocomplete(
+        indexes["title_index"], indexes["reviews_index"]
+    )
+    indexes["pagerank_index"] = TP2.create_index_pagerank(documents)
+    indexes["vector_index"] = TP2.create_index_vectors(documents)
+    indexes["term_dictionary"] = TP2.create_index_terms(
+        indexes["title_index"],
+        indexes["description_index"],
+        indexes["brand_index"],
+        indexes["origin_index"]
+    )
+
+    return indexes
+
+
+def save_indexes(indexes: dict, output_dir: str):
+    """
+    Saves the indexes of TP2 in the layout read by TP3.
+
+    Args:
+        indexes (dict): The indexes
+
+        output_dir (str): The directory of the indexes
+    """
+
+    import TP2
+
+    TP2.save_index_title(
+        indexes["title_index"],
+        path=os.path.join(output_dir, "title_index.json")
+    )
+    TP2.save_index_description(
+        indexes["description_index"],
+        path=os.path.join(output_dir, "description_index.json")
+    )
+    TP2.save_index_origin(
+        indexes["origin_index"],
+        path=os.path.join(output_dir, "origin_index.json")
+    )
+    TP2.save_index_brand(
+        indexes["brand_index"],
+        path=os.path.join(output_dir, "brand_index.json")
+    )
+
+    TP2.save_index_reviews(
+        indexes["reviews_index"],
+        path=os.path.join(output_dir, "reviews_index.json")
+    )
+    TP2.save_review_stats(
+        indexes["review_stats"],
+        path=os.path.join(output_dir, "review_stats.npz")
+    )
+    TP2.save_index_fuzzy(
+        indexes["fuzzy_index"],
+        path=os.path.join(output_dir, "fuzzy_index.json")
+    )
+    TP2.save_index_autocomplete(
+        indexes["autocomplete"],
+        path=os.path.join(output_dir, "autocomplete.bin")
+    )
+    TP2.save_index_pagerank(
+        indexes["pagerank_index"],
+        path=os.path.join(output_dir, "pagerank_index.json")
+    )
+    TP2.save_index_vectors(
+        indexes["vector_index"],
+        path=os.path.join(output_dir, "vector_index.npz")
+    )
+    TP2.save_index_terms(
+        indexes["term_dictionary"],
+        path=os.path.join(output_dir, "term_dictionary.bin")
+    )
+
+    shutil.copy(
+        os.path.join(ROOT, "TP3/input/origin_synonyms.json"),
+        os.path.join(output_dir, "origin_synonyms.json")
+    )
+
+
+def benchmark_build(documents: list, repeats: int, with_memory: bool) -> dict:
+    """
+    Builds the indexes of a synthetic catalog.
+
+    Args:
+        documents (list): The documents
+
+        repeats (int): The number of runs
+
+        with_memory (bool): Whether the peak memory is measured
+
+    Returns:
+        dict: The metrics
+    """
+
+    def run():
+        return build_indexes(documents)
+
+    times, _ = measure(run, repeats)
+    memory = measure_memory(run) if with_memory else None
+
+    return get_metrics(times, len(documents), memory)
+
+
+def benchmark_load(
+    index_dir: str,
+    n_docs: int,
+    repeats: int,
+    with_memory: bool
+) -> dict:
+    """
+    Loads the indexes of a synthetic catalog in a TP3 snapshot.
+
+    Args:
+        index_dir (str): The directory of the indexes
+
+        n_docs (int): The number of documents
+
+        repeats (int): The number of runs
+
+        with_memory (bool): Whether the peak memory is measured
+
+    Returns:
+        dict: The metrics
+    """
+
+    from searcher import load_snapshot
+
+    def run():
+        return load_snapshot(input_dir=index_dir, version=1)
+
+    times, _ = measure(run, repeats)
+    memory = measure_memory(run) if with_memory else None
+
+    return get_metrics(times, n_docs, memory)
+
+
+def benchmark_query(
+    index_dir: str,
+    documents: list,
+    repeats: int,
+    with_memory: bool,
+    k: int = None
+) -> dict:
+    """
+    Ranks the documents of a synthetic catalog for several queries.
+
+    Args:
+        index_dir (str): The directory of the indexes
+
+        documents (list): The documents
+
+        repeats (int): The number of runs of each query
+
+        with_memory (bool): Whether the peak memory is measured
+
+        k (int): If given, only the k best documents are searched
+            (with the impact index) instead of scoring all of them
+
+    Returns:
+        dict: The metrics
+    """
+
+    import TP3
+    from searcher import load_snapshot
+
+    snapshot = load_snapshot(input_dir=index_dir, version=1)
+
+    def rank(query):
+        if k is None:
+            return TP3.get_score_for_all_url(query, documents, snapshot)
+        return TP3.get_top_k_scores(query, snapshot, k=k)
+
+    latencies = []
+
+    for query in QUERIES:
+        times, _ = measure(lambda: rank(query), repeats)
+        latencies.extend(times)
+
+    memory = None
+    if with_memory:
+        memory = measure_memory(lambda: rank(QUERIES[0]))
+
+    latencies.sort()
+    metrics = get_metrics(latencies, len(documents), memory)
+    metrics["items_per_second"] = 1 / metrics["seconds"]
+    metrics["p50_ms"] = 1000 * latencies[len(latencies) // 2]
+    metrics["p95_ms"] = 1000 * latencies[int(0.95 * (len(latencies) - 1))]
+
+    return metrics
+
+
+def run_benchmarks(
+    sizes: list[int],
+    stages: list[str],
+    repeats: int,
+    with_memory: bool,
+    seed: int = 0
+) -> dict:
+    """
+    Runs the benchmarks of the given stages on catalogs of the
+    given sizes.
+
+    Args:
+        sizes (list[int]): The numbers of documents
+
+        stages (list[str]): The stages to run
+
+        repeats (int): The number of runs
+
+        with_memory (bool): Whether the peak memory is measured
+
+        seed (int): The seed of the catalogs
+
+    Returns:
+        dict: The metrics of each "stage@size"
+    """
+
+    results = {}
+
+    for size in sizes:
+
+        if "crawl" in stages:
+            results[f"crawl@{size}"] = benchmark_crawl(
+                size, repeats, with_memory
+            )
+
+        if not {"build", "load", "query", "top_k"} & set(stages):
+            continue
+
+        # The indexes of TP2 are built from a list of documents, so
+        # these stages hold the whole catalog in memory (unlike the
+        # crawl, where the local site generates each page on request)
+        documents = list(generate_catalog(n_docs=size, seed=seed))
+
+        if "build" in stages:
+            results[f"build@{size}"] = benchmark_build(
+                documents, repeats, with_memory
+            )
+
+        if not {"load", "query", "top_k"} & set(stages):
+            continue
+
+        with tempfile.TemporaryDirectory() as index_dir:
+            save_indexes(build_indexes(documents), index_dir)
+
+            if "load" in stages:
+                results[f"load@{size}"] = benchmark_load(
+                    index_dir, size, repeats, with_memory
+                )
+
+            if "query" in stages:
+                results[f"query@{size}"] = benchmark_query(
+                    index_dir, documents, repeats, with_memory
+                )
+
+            if "top_k" in stages:
+                results[f"top_k@{size}"] = benchmark_query(
+                    index_dir, documents, repeats, with_memory, k=10
+                )
+
+    return results
+
+
+def find_regressions(
+    results: dict,
+    baseline: dict,
+    tolerance: float
+) -> list[str]:
+    """
+    Compares the results with a baseline.
+
+    Args:
+        results (dict): The metrics of each "stage@size"
+
+        baseline (dict): The metrics of the baseline
+
+        tolerance (float): The accepted relative increase (0.2 = 20%)
+
+    Returns:
+        list[str]: The description of each regression
+    """
+
+    regressions = []
+
+    for name, metrics in results.items():
+        if name not in baseline:
+            continue
+
+        for metric in COMPARED_METRICS:
+            old = baseline[name].get(metric)
+            new = metrics.get(metric)
+
+            if old and new and new > old * (1 + tolerance):
+                regressions.append(
+                    f"{name} {metric}: {old:.4g} -> {new:.4g} "
+                    f"(+{100 * (new / old - 1):.0f}%)"
+                )
+
+    return regressions
+
+
+def print_results(results: dict):
+    """
+    Prints the metrics as a table.
+
+    Args:
+        results (dict): The metrics of each "stage@size"
+    """
+
+    print(f"{'benchmark':<20}{'seconds':>12}{'items/s':>14}"
+          f"{'p95 ms':>10}{'peak MB':>10}")
+
+    for name, metrics in results.items():
+        p95 = metrics.get("p95_ms")
+        memory = metrics.get("peak_memory_mb")
+        print(
+            f"{name:<20}{metrics['seconds']:>12.4f}"
+            f"{metrics['items_per_second'] or 0:>14.1f}"
+            f"{'' if p95 is None else f'{p95:.2f}':>10}"
+            f"{'' if memory is None else f'{memory:.1f}':>10}"
+        )
+
+
+def main() -> int:
+
+    parser = argparse.ArgumentParser(
+        description="Benchmarks of the crawler, the indexer and the searcher"
+    )
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000])
+    parser.add_argument("--stages", nargs="+", choices=STAGES, default=STAGES)
+    parser.add_argument("--repeats", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--no-memory", action="store_true")
+    parser.add_argument(
+        "--baseline",
+        default=os.path.join(ROOT, "benchmark/baseline.json")
+    )
+    parser.add_argument("--save-baseline", action="store_true")
+    parser.add_argument("--tolerance", type=float, default=0.2)
+    parser.add_argument("--output", help="Writes the results in a json file")
+    args = parser.parse_args()
+
+    results = run_benchmarks(
+        sizes=args.sizes,
+        stages=args.stages,
+        repeats=args.repeats,
+        with_memory=not args.no_memory,
+        seed=args.seed
+    )
+    print_results(results)
+
+    report = {
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "results": results,
+    }
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=4)
+
+    if args.save_baseline:
+        baseline = {"results": {}}
+        if os.path.exists(args.baseline):
+            with open(args.baseline, "r", encoding="utf-8") as f:
+                baseline = json.load(f)
+        baseline.update({k: v for k, v in report.items() if k != "results"})
+        baseline["results"].update(results)
+
+        with open(args.baseline, "w", encoding="utf-8") as f:
+            json.dump(baseline, f, indent=4)
+        print(f"Baseline saved in {args.baseline}")
+        return 0
+
+    if not os.path.exists(args.baseline):
+        print("No baseline to compare with (use --save-baseline)")
+        return 0
+
+    with open(args.baseline, "r", encoding="utf-8") as f:
+        baseline = json.load(f)["results"]
+
+    regressions = find_regressions(results, baseline, args.tolerance)
+
+    for regression in regressions:
+        print(f"REGRESSION {regression}")
+
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,204 @@
+import numpy as np
+
+
+def normalize(vectors: np.ndarray) -> np.ndarray:
+    """
+    Scales vectors to a norm of 1 (null vectors stay null), so that
+    a dot product gives the cosine similarity.
+
+    Args:
+        vectors (np.ndarray): The vectors (one per row) or a vector
+
+    Returns:
+        np.ndarray: The normalized float32 vectors
+    """
+
+    vectors = np.asarray(vectors, dtype=np.float32)
+    norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+
+    return np.divide(
+        vectors, norms, out=np.zeros_like(vectors), where=norms > 0
+    )
+
+
+def train_centroids(
+    vectors: np.ndarray,
+    n_lists: int,
+    n_iterations: int = 20,
+    sample_size: int = 100_000,
+    seed: int = 0
+) -> np.ndarray:
+    """
+    Finds the centroids of the lists of an IVF index with a
+    spherical k-means on a sample of the vectors.
+
+    Args:
+        vectors (np.ndarray): The normalized vectors
+
+        n_lists (int): The number of lists (clusters)
+
+        n_iterations (int): The number of k-means iterations
+
+        sample_size (int): The maximum number of vectors used
+
+        seed (int): The seed of the random generator
+
+    Returns:
+        np.ndarray: The normalized centroids
+    """
+
+    rng = np.random.default_rng(seed)
+
+    if len(vectors) > sample_size:
+        vectors = vectors[rng.choice(len(vectors), sample_size, replace=False)]
+
+    centroids = vectors[rng.choice(len(vectors), n_lists, replace=False)]
+
+    for _ in range(n_iterations):
+        assignment = np.argmax(vectors @ centroids.T, axis=1)
+
+        sums = np.zeros_like(centroids)
+        np.add.at(sums, assignment, vectors)
+
+        # An empty list keeps its previous centroid
+        empty = ~np.bincount(assignment, minlength=n_lists).astype(bool)
+        sums[empty] = centroids[empty]
+
+        centroids = normalize(sums)
+
+    return centroids
+
+
+def create_ann_index(
+    urls: list,
+    vectors: np.ndarray,
+    n_lists: int = None,
+    batch_size: int = 65536
+) -> dict:
+    """
+    Creates an IVF (inverted file) index: the vectors are grouped
+    by closest centroid, and a query only compares itself with the
+    vectors of the lists whose centroids are the closest.
+
+    Args:
+        urls (list): The URL of each vector
+
+        vectors (np.ndarray): The vectors of the documents
+
+        n_lists (int): The number of lists (by default about the
+            square root of the number of documents)
+
+        batch_size (int): The number of vectors assigned at once
+
+    Returns:
+        dict: {
+            "urls": np.ndarray,
+            "vectors": np.ndarray,
+            "centroids": np.ndarray,
+            "offsets": np.ndarray
+        }
+    """
+
+    vectors = normalize(vectors)
+    n_lists = n_lists or max(1, int(np.sqrt(len(vectors))))
+    n_lists = min(n_lists, len(vectors))
+
+    centroids = train_centroids(vectors, n_lists)
+
+    assignment = np.concatenate([
+        np.argmax(vectors[start:start + batch_size] @ centroids.T, axis=1)
+        for start in range(0, len(vectors), batch_size)
+    ])
+
+    # The vectors of a list are stored next to each other
+    order = np.argsort(assignment, kind="stable")
+    offsets = np.zeros(n_lists + 1, dtype=np.int64)
+    offsets[1:] = np.cumsum(np.bincount(assignment, minlength=n_lists))
+
+    return {
+        "urls": np.asarray(urls)[order],
+        "vectors": vectors[order],
+        "centroids": centroids,
+        "offsets": offsets,
+    }
+
+
+def save_ann_index(ann_index: dict, path: str):
+    """
+    Saves an IVF index in a npz file.
+
+    Args:
+        ann_index (dict): The index
+
+        path (str): The path of the file
+    """
+
+    np.savez(path, **ann_index)
+
+
+def load_ann_index(path: str) -> dict:
+    """
+    Loads an IVF index from a npz file.
+
+    Args:
+        path (str): The path of the file
+
+    Returns:
+        dict: The index
+    """
+
+    with np.load(path) as data:
+        return {name: data[name] for name in data.files}
+
+
+def search_ann_index(
+    ann_index: dict,
+    query_vector: np.ndarray,
+    k: int = 50,
+    n_probes: int = 8
+) -> list[tuple[str, float]]:
+    """
+    Finds the documents whose vectors are the most similar to the
+    query vector (approximately: only the n_probes closest lists
+    are searched).
+
+    Args:
+        ann_index (dict): The IVF index
+
+        query_vector (np.ndarray): The normalized query vector
+
+        k (int): The number of documents
+
+        n_probes (int): The number of lists searched
+
+    Returns:
+        list[tuple[str, float]]: The (url, cosine similarity) pairs,
+            the most similar first
+    """
+
+    if not query_vector.any():
+        return []
+
+    centroids = ann_index["centroids"]
+    offsets = ann_index["offsets"]
+
+    n_probes = min(n_probes, len(centroids))
+    lists = np.argpartition(-(centroids @ query_vector), n_probes - 1)
+    lists = lists[:n_probes]
+
+    positions = np.concatenate([
+        np.arange(offsets[i], offsets[i + 1]) for i in lists
+    ])
+    if len(positions) == 0:
+        return []
+
+    similarities = ann_index["vectors"][positions] @ query_vector
+
+    k = min(k, len(positions))
+    best = np.argpartition(-similarities, k - 1)[:k]
+    best = best[np.argsort(-similarities[best])]
+
+    return [
+        (str(ann_index["urls"][positions[i]]), float(similarities[i]))
+        for i in best
+    ]
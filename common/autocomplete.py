@@ -0,0 +1,257 @@
+import mmap
+import os
+import struct
+
+
+# Layout of the file (little endian):
+#   header: magic, version, number of terms, number of prefixes, top n
+#   term offsets (u32), term bytes (utf-8), term scores (f32)
+#   prefix offsets (u32), prefix bytes (utf-8)
+#   completions: top n term ids (u32) for each prefix
+MAGIC = b"ACPL"
+VERSION = 1
+HEADER = struct.Struct("<4sIIII")
+NO_TERM = 0xFFFFFFFF
+
+
+def get_term_scores(title_index: dict, reviews_index: dict) -> dict:
+    """
+    Gives a popularity score to each term of the titles: each
+    document containing the term counts for 1, plus a bonus for
+    its average rating.
+
+    Args:
+        title_index (dict): The inverted index of the titles
+
+        reviews_index (dict): The index of the reviews
+
+    Returns:
+        dict: The score of each term
+    """
+
+    scores = {}
+
+    for term, postings in title_index.items():
+        score = 0
+
+        for url in postings:
+            review = reviews_index.get(url, {})
+            # TP2 writes "average_rating", the files of TP3/input "mean_mark"
+            rating = review.get("average_rating", review.get("mean_mark")) or 0
+            score += 1 + rating / 5
+
+        scores[term] = score
+
+    return scores
+
+
+def create_autocomplete(
+    term_scores: dict,
+    top_n: int = 10,
+    max_prefix_length: int = 8
+) -> bytes:
+    """
+    Creates the autocomplete structure: the sorted terms and, for
+    each prefix of up to max_prefix_length characters, the ids of
+    its best completions.
+
+    Args:
+        term_scores (dict): The score of each term
+
+        top_n (int): The number of completions kept for each prefix
+
+        max_prefix_length (int): The length of the longest prefix
+            stored (longer ones are answered by scanning the terms)
+
+    Returns:
+        bytes: The content of the file
+    """
+
+    terms = sorted(term for term in term_scores if term)
+    term_ids = {term: term_id for term_id, term in enumerate(terms)}
+
+    # The best terms are seen first, so each prefix keeps its top n
+    completions = {}
+    for term in sorted(terms, key=lambda term: -term_scores[term]):
+        for length in range(1, min(len(term), max_prefix_length) + 1):
+            best = completions.setdefault(term[:length], [])
+            if len(best) < top_n:
+                best.append(term_ids[term])
+
+    prefixes = sorted(completions)
+
+    encoded_terms = [term.encode("utf-8") for term in terms]
+    encoded_prefixes = [prefix.encode("utf-8") for prefix in prefixes]
+
+    parts = [HEADER.pack(MAGIC, VERSION, len(terms), len(prefixes), top_n)]
+    parts.append(get_offsets(encoded_terms))
+    parts.append(b"".join(encoded_terms))
+    parts.append(
+        struct.pack(f"<{len(terms)}f", *(term_scores[term] for term in terms))
+    )
+    parts.append(get_offsets(encoded_prefixes))
+    parts.append(b"".join(encoded_prefixes))
+
+    for prefix in prefixes:
+        best = completions[prefix] + [NO_TERM] * (top_n - len(completions[prefix]))
+        parts.append(struct.pack(f"<{top_n}I", *best))
+
+    return b"".join(parts)
+
+
+def get_offsets(strings: list[bytes]) -> bytes:
+    """
+    Gives the start of each string in their concatenation, plus the
+    end of the last one.
+    """
+
+    offsets = [0]
+
+    for string in strings:
+        offsets.append(offsets[-1] + len(string))
+
+    return struct.pack(f"<{len(offsets)}I", *offsets)
+
+
+def save_autocomplete(content: bytes, path: str):
+    """
+    Saves the autocomplete structure in a binary file.
+
+    The file is written next to the old one, then renamed over it: a
+    searcher which has the old one memory-mapped keeps reading it,
+    whereas truncating it would crash the searcher (SIGBUS).
+
+    Args:
+        content (bytes): The structure
+
+        path (str): The path of the file
+    """
+
+    temporary_path = f"{path}.{os.getpid()}.tmp"
+
+    with open(temporary_path, "wb") as file:
+        file.write(content)
+
+    os.replace(temporary_path, path)
+
+
+class Autocomplete:
+    """
+    Gives the completions of a prefix from an autocomplete file,
+    which is memory-mapped and not loaded in memory.
+    """
+
+    def __init__(self, path: str):
+        with open(path, "rb") as file:
+            self._buffer = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+
+        magic, version, self.n_terms, self.n_prefixes, self.top_n = (
+            HEADER.unpack_from(self._buffer, 0)
+        )
+        if magic != MAGIC or version != VERSION:
+            raise ValueError(f"{path} is not an autocomplete file")
+
+        position = HEADER.size
+        self._term_offsets = position
+        position += 4 * (self.n_terms + 1)
+        self._terms = position
+        position += self._get_offset(self._term_offsets, self.n_terms)
+        self._scores = position
+        position += 4 * self.n_terms
+        self._prefix_offsets = position
+        position += 4 * (self.n_prefixes + 1)
+        self._prefixes = position
+        position += self._get_offset(self._prefix_offsets, self.n_prefixes)
+        self._completions = position
+
+    def close(self):
+        self._buffer.close()
+
+    def _get_offset(self, table: int, position: int) -> int:
+        return struct.unpack_from("<I", self._buffer, table + 4 * position)[0]
+
+    def _get_string(self, table: int, strings: int, position: int) -> bytes:
+        start, end = struct.unpack_from(
+            "<II", self._buffer, table + 4 * position
+        )
+        return self._buffer[strings + start:strings + end]
+
+    def get_term(self, term_id: int) -> str:
+        return self._get_string(
+            self._term_offsets, self._terms, term_id
+        ).decode("utf-8")
+
+    def get_score(self, term_id: int) -> float:
+        return struct.unpack_from(
+            "<f", self._buffer, self._scores + 4 * term_id
+        )[0]
+
+    def _lower_bound(self, table: int, strings: int, size: int, key: bytes):
+        # First position whose string is not lower than the key
+        low, high = 0, size
+        while low < high:
+            middle = (low + high) // 2
+            if self._get_string(table, strings, middle) < key:
+                low = middle + 1
+            else:
+                high = middle
+        return low
+
+    def complete(self, prefix: str, n: int = None) -> list[tuple[str, float]]:
+        """
+        Gives the best terms starting with a prefix.
+
+        Args:
+            prefix (str): The beginning of the word typed by the user
+
+            n (int): The number of completions (at most top_n)
+
+        Returns:
+            list[tuple[str, float]]: The (term, score) pairs, the
+                best first
+        """
+
+        n = min(n or self.top_n, self.top_n)
+        key = prefix.lower().encode("utf-8")
+
+        if not key:
+            return []
+
+        position = self._lower_bound(
+            self._prefix_offsets, self._prefixes, self.n_prefixes, key
+        )
+
+        if (
+            position < self.n_prefixes
+            and self._get_string(
+                self._prefix_offsets, self._prefixes, position
+            ) == key
+        ):
+            term_ids = struct.unpack_from(
+                f"<{self.top_n}I",
+                self._buffer,
+                self._completions + 4 * self.top_n * position
+            )
+            return [
+                (self.get_term(term_id), self.get_score(term_id))
+                for term_id in term_ids[:n] if term_id != NO_TERM
+            ]
+
+        return self._scan(key, n)
+
+    def _scan(self, key: bytes, n: int) -> list[tuple[str, float]]:
+        # The prefix is longer than the stored ones: the terms starting
+        # with it are next to each other in the sorted terms
+        found = []
+        term_id = self._lower_bound(
+            self._term_offsets, self._terms, self.n_terms, key
+        )
+
+        while term_id < self.n_terms:
+            term = self._get_string(self._term_offsets, self._terms, term_id)
+            if not term.startswith(key):
+                break
+            found.append((term.decode("utf-8"), self.get_score(term_id)))
+            term_id += 1
+
+        return sorted(found, key=lambda item: -item[1])[:n]
@@ -0,0 +1,236 @@
+# Score factor of a term found with 1 or 2 typos
+DEFAULT_PENALTIES = {1: 0.5, 2: 0.25}
+
+# Words up to this length are only corrected with 1 typo: with 2, a
+# short word is close to too many unrelated terms ("for" -> "box")
+SHORT_WORD_LENGTH = 4
+
+
+def get_deletes(term: str, max_distance: int, prefix_length: int) -> set[str]:
+    """
+    Gives all the strings obtained by removing up to max_distance
+    characters from the prefix of a term (SymSpell).
+
+    Args:
+        term (str): The term
+
+        max_distance (int): The maximum number of removed characters
+
+        prefix_length (int): The number of characters considered
+
+    Returns:
+        set[str]: The deletes, including the prefix itself
+    """
+
+    prefix = term[:prefix_length]
+    deletes = {prefix}
+    current = {prefix}
+
+    for _ in range(max_distance):
+        following = set()
+
+        for word in current:
+            if len(word) <= 1:
+                continue
+            for position in range(len(word)):
+                following.add(word[:position] + word[position + 1:])
+
+        deletes |= following
+        current = following
+
+    return deletes
+
+
+def get_distance(first: str, second: str, max_distance: int) -> int:
+    """
+    Computes the Damerau-Levenshtein distance (optimal string
+    alignment) between two strings, stopping as soon as it is
+    greater than max_distance.
+
+    Args:
+        first (str): The first string
+
+        second (str): The second string
+
+        max_distance (int): The maximum distance of interest
+
+    Returns:
+        int: The distance, or max_distance + 1 if it is greater
+    """
+
+    if abs(len(first) - len(second)) > max_distance:
+        return max_distance + 1
+
+    previous_previous = None
+    previous = list(range(len(second) + 1))
+
+    for i in range(1, len(first) + 1):
+        current = [i] + [0] * len(second)
+
+        for j in range(1, len(second) + 1):
+            cost = 0 if first[i - 1] == second[j - 1] else 1
+            current[j] = min(
+                previous[j] + 1,
+                current[j - 1] + 1,
+                previous[j - 1] + cost
+            )
+
+            # Transposition of two adjacent characters
+            if (
+                i > 1 and j > 1
+                and first[i - 1] == second[j - 2]
+                and first[i - 2] == second[j - 1]
+            ):
+                current[j] = min(current[j], previous_previous[j - 2] + 1)
+
+        if min(current) > max_distance:
+            return max_distance + 1
+
+        previous_previous, previous = previous, current
+
+    return min(previous[-1], max_distance + 1)
+
+
+def create_fuzzy_index(
+    terms,
+    max_distance: int = 2,
+    prefix_length: int = 7
+) -> dict:
+    """
+    Creates the deletion index of a term dictionary, which gives the
+    terms close to a misspelled word without scanning the dictionary.
+
+    Args:
+        terms (iterable[str]): The terms of the indexes
+
+        max_distance (int): The maximum number of typos
+
+        prefix_length (int): The number of characters indexed
+
+    Returns:
+        dict: {
+            "max_distance": int,
+            "prefix_length": int,
+            "deletes": dict
+        }
+    """
+
+    deletes = {}
+
+    for term in sorted(set(terms)):
+        for delete in get_deletes(term, max_distance, prefix_length):
+            deletes.setdefault(delete, []).append(term)
+
+    return {
+        "max_distance": max_distance,
+        "prefix_length": prefix_length,
+        "deletes": deletes
+    }
+
+
+def lookup(fuzzy_index: dict, word: str, max_distance: int = 2) -> dict:
+    """
+    Finds the terms of the dictionary close to a word.
+
+    Args:
+        fuzzy_index (dict): The deletion index
+
+        word (str): The (possibly misspelled) word
+
+        max_distance (int): The maximum number of typos, bounded by
+            the one of the index
+
+    Returns:
+        dict: The distance of each term found
+    """
+
+    max_distance = min(max_distance, fuzzy_index["max_distance"])
+    prefix_length = fuzzy_index["prefix_length"]
+    deletes = fuzzy_index["deletes"]
+
+    candidates = set()
+
+    for delete in get_deletes(word, max_distance, prefix_length):
+        candidates.update(deletes.get(delete, ()))
+
+    found = {}
+
+    for term in candidates:
+        distance = get_distance(word, term, max_distance)
+        if distance <= max_distance:
+            found[term] = distance
+
+    return found
+
+
+def get_max_distance(word: str, max_distance: int = 2) -> int:
+    """
+    Gives the number of typos allowed in a word, depending on its
+    length.
+
+    Args:
+        word (str): The word
+
+        max_distance (int): The maximum number of typos
+
+    Returns:
+        int: The number of typos (0 if the word is not corrected)
+    """
+
+    if len(word) <= SHORT_WORD_LENGTH:
+        max_distance = min(max_distance, 1)
+
+    # A word of n characters is at distance n of every short term
+    return max_distance if len(word) > max_distance else 0
+
+
+def expand_tokens(
+    tokens: list,
+    fuzzy_index: dict,
+    known_terms,
+    max_distance: int = 2,
+    penalties: dict = None,
+    ignored_terms=None
+) -> list[tuple[str, float]]:
+    """
+    Gives the terms replacing the tokens of a query that are not in
+    the dictionary, with the factor applied to their score.
+
+    Args:
+        tokens (list): The tokens of the query
+
+        fuzzy_index (dict): The deletion index
+
+        known_terms (callable): Tells if a token is in the dictionary
+
+        max_distance (int): The maximum number of typos (see
+            get_max_distance for short words)
+
+        penalties (dict): The score factor for each distance
+
+        ignored_terms (callable): Tells if a token is never indexed
+            (stop words, punctuation), so it is not corrected either
+
+    Returns:
+        list[tuple[str, float]]: The (term, score factor) pairs, each
+            term once with its best factor
+    """
+
+    penalties = penalties or DEFAULT_PENALTIES
+    expansions = {}
+
+    for token in tokens:
+        if not token or known_terms(token):
+            continue
+        if ignored_terms is not None and ignored_terms(token):
+            continue
+
+        token_distance = get_max_distance(token, max_distance)
+        if token_distance == 0:
+            continue
+
+        for term, distance in lookup(fuzzy_index, token, token_distance).items():
+            penalty = penalties.get(distance, 0)
+            expansions[term] = max(expansions.get(term, penalty), penalty)
+
+    return list(expansions.items())
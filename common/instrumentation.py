@@ -0,0 +1,420 @@
+import atexit
+import collections
+import json
+import os
+import sys
+import threading
+import time
+
+
+# Upper bounds of the buckets of the histograms, in seconds for the timers
+DEFAULT_BUCKETS = (
+    0.0001, 0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1, 5, 10
+)
+
+# The metrics can be enabled without changing the code: METRICS=1
+_enabled = os.environ.get("METRICS", "0") not in ("", "0")
+
+_lock = threading.Lock()
+_counters = {}
+_gauges = {}
+_histograms = {}
+
+
+class Histogram:
+    """
+    Distribution of the observed values of a metric.
+    """
+
+    __slots__ = ("buckets", "counts", "count", "sum", "min", "max")
+
+    def __init__(self, buckets: tuple = DEFAULT_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self.min = None
+        self.max = None
+
+    def observe(self, value: float):
+        """
+        Adds a value to the histogram.
+
+        Args:
+            value (float): The observed value
+        """
+
+        position = 0
+        while position < len(self.buckets) and value > self.buckets[position]:
+            position += 1
+
+        self.counts[position] += 1
+        self.count += 1
+        self.sum += value
+        self.min = value if self.min is None else min(self.min, value)
+        self.max = value if self.max is None else max(self.max, value)
+
+    def to_dict(self) -> dict:
+        return {
+            "count": self.count,
+            "sum": self.sum,
+            "mean": self.sum / self.count if self.count else None,
+            "min": self.min,
+            "max": self.max,
+            "buckets": {
+                str(bound): count
+                for bound, count in zip(self.buckets + ("+Inf",), self.counts)
+            },
+        }
+
+
+class _Timer:
+
+    __slots__ = ("name", "start")
+
+    def __init__(self, name: str):
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        observe(self.name, time.perf_counter() - self.start)
+        return False
+
+
+class _NullTimer:
+
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+
+# A single object is used when the metrics are disabled, so that a timer
+# costs one function call and one test
+_NULL_TIMER = _NullTimer()
+
+
+def enable():
+    """
+    Starts recording the metrics.
+    """
+
+    global _enabled
+    _enabled = True
+
+
+def disable():
+    """
+    Stops recording the metrics.
+    """
+
+    global _enabled
+    _enabled = False
+
+
+def is_enabled() -> bool:
+    return _enabled
+
+
+def reset():
+    """
+    Forgets all the recorded metrics.
+    """
+
+    with _lock:
+        _counters.clear()
+        _gauges.clear()
+        _histograms.clear()
+
+
+def count(name: str, value: float = 1):
+    """
+    Increments a counter.
+
+    Args:
+        name (str): The name of the counter
+
+        value (float): The increment
+    """
+
+    if not _enabled:
+        return
+
+    with _lock:
+        _counters[name] = _counters.get(name, 0) + value
+
+
+def set_gauge(name: str, value: float):
+    """
+    Sets the current value of a gauge.
+
+    Args:
+        name (str): The name of the gauge
+
+        value (float): The value
+    """
+
+    if not _enabled:
+        return
+
+    with _lock:
+        _gauges[name] = value
+
+
+def observe(name: str, value: float):
+    """
+    Adds a value to a histogram.
+
+    Args:
+        name (str): The name of the histogram
+
+        value (float): The observed value
+    """
+
+    if not _enabled:
+        return
+
+    with _lock:
+        histogram = _histograms.get(name)
+        if histogram is None:
+            histogram = _histograms[name] = Histogram()
+        histogram.observe(value)
+
+
+def timer(name: str):
+    """
+    Measures the duration of a block of code in a histogram.
+
+    Args:
+        name (str): The name of the histogram (in seconds)
+
+    Returns:
+        A context manager
+    """
+
+    if not _enabled:
+        return _NULL_TIMER
+
+    return _Timer(name)
+
+
+def timed(name: str):
+    """
+    Measures the duration of each call of a function.
+
+    Args:
+        name (str): The name of the histogram (in seconds)
+
+    Returns:
+        A decorator
+    """
+
+    def decorator(function):
+
+        def wrapper(*args, **kwargs):
+            if not _enabled:
+                return function(*args, **kwargs)
+
+            with _Timer(name):
+                return function(*args, **kwargs)
+
+        wrapper.__name__ = function.__name__
+        wrapper.__doc__ = function.__doc__
+        wrapper.__wrapped__ = function
+
+        return wrapper
+
+    return decorator
+
+
+# Export
+
+def get_report() -> dict:
+    """
+    Gives all the recorded metrics.
+
+    Returns:
+        dict: {
+            "counters": dict,
+            "gauges": dict,
+            "histograms": dict
+        }
+    """
+
+    with _lock:
+        return {
+            "counters": dict(_counters),
+            "gauges": dict(_gauges),
+            "histograms": {
+                name: histogram.to_dict()
+                for name, histogram in _histograms.items()
+            },
+        }
+
+
+def save_json_report(path: str):
+    """
+    Saves the recorded metrics in a json file.
+
+    Args:
+        path (str): The path of the file
+    """
+
+    with open(path, "w", encoding="utf-8") as file:
+        json.dump(get_report(), file, indent=4)
+
+
+def to_prometheus() -> str:
+    """
+    Gives the recorded metrics in the Prometheus text format.
+
+    Returns:
+        str: The metrics
+    """
+
+    lines = []
+
+    with _lock:
+        for name, value in sorted(_counters.items()):
+            lines.append(f"# TYPE {name} counter")
+            lines.append(f"{name} {value}")
+
+        for name, value in sorted(_gauges.items()):
+            lines.append(f"# TYPE {name} gauge")
+            lines.append(f"{name} {value}")
+
+        for name, histogram in sorted(_histograms.items()):
+            lines.append(f"# TYPE {name} histogram")
+
+            cumulative = 0
+            for bound, bucket_count in zip(
+                histogram.buckets + ("+Inf",), histogram.counts
+            ):
+                cumulative += bucket_count
+                lines.append(f'{name}_bucket{{le="{bound}"}} {cumulative}')
+
+            lines.append(f"{name}_sum {histogram.sum}")
+            lines.append(f"{name}_count {histogram.count}")
+
+    return "\n".join(lines) + "\n"
+
+
+def save_prometheus(path: str):
+    """
+    Saves the recorded metrics in a file in the Prometheus text
+    format (for example for the textfile collector of node_exporter).
+
+    Args:
+        path (str): The path of the file
+    """
+
+    with open(path, "w", encoding="utf-8") as file:
+        file.write(to_prometheus())
+
+
+# Sampling profiler
+
+_profiler = None
+
+
+def _get_stack(frame) -> str:
+    """
+    Gives the stack of a frame in the "collapsed" format used by
+    flame graphs (from the outermost call to the innermost one).
+    """
+
+    names = []
+
+    while frame is not None:
+        code = frame.f_code
+        names.append(
+            f"{os.path.basename(code.co_filename)}:{code.co_name}"
+        )
+        frame = frame.f_back
+
+    return ";".join(reversed(names))
+
+
+def start_profiler(interval: float = 0.005, thread_id: int = None):
+    """
+    Starts a sampling profiler which records the stack of a thread
+    at regular intervals. It has no cost on the profiled code other
+    than the sampling thread itself.
+
+    Args:
+        interval (float): The time between two samples in seconds
+
+        thread_id (int): The profiled thread (by default the current one)
+    """
+
+    global _profiler
+
+    if _profiler is not None:
+        return
+
+    thread_id = thread_id or threading.get_ident()
+    samples = collections.Counter()
+    stop = threading.Event()
+
+    def sample():
+        while not stop.wait(interval):
+            frame = sys._current_frames().get(thread_id)
+            if frame is not None:
+                samples[_get_stack(frame)] += 1
+
+    thread = threading.Thread(target=sample, daemon=True)
+    _profiler = (thread, stop, samples)
+    thread.start()
+
+
+def stop_profiler() -> collections.Counter:
+    """
+    Stops the sampling profiler.
+
+    Returns:
+        collections.Counter: The number of samples of each stack
+    """
+
+    global _profiler
+
+    if _profiler is None:
+        return collections.Counter()
+
+    thread, stop, samples = _profiler
+    stop.set()
+    thread.join()
+    _profiler = None
+
+    return samples
+
+
+def save_profile(samples: collections.Counter, path: str):
+    """
+    Saves the samples of the profiler in the collapsed format
+    (readable by flamegraph.pl or speedscope).
+
+    Args:
+        samples (collections.Counter): The samples
+
+        path (str): The path of the file
+    """
+
+    with open(path, "w", encoding="utf-8") as file:
+        for stack, number in samples.most_common():
+            file.write(f"{stack} {number}\n")
+
+
+def _profile_at_exit(path: str):
+    save_profile(stop_profiler(), path)
+
+
+# The profiler can be enabled without changing the code: PROFILE=profile.txt
+if os.environ.get("PROFILE"):
+    start_profiler()
+    atexit.register(_profile_at_exit, os.environ["PROFILE"])
@@ -0,0 +1,353 @@
+import datetime
+import json
+import math
+
+import numpy as np
+
+
+# Number of days after which a review counts half as much in the
+# time-decayed mean
+HALF_LIFE_DAYS = 180
+
+# The aggregates kept for each product. The dates are day ordinals
+# (0 without date).
+FIELDS = {
+    "count": np.int64,
+    "sum": np.float64,
+    "last": np.float64,
+    "last_date": np.int64,
+    "decayed_sum": np.float64,
+    "decayed_weight": np.float64,
+    "decayed_date": np.int64,
+}
+
+
+def to_ordinal(date: str) -> int:
+    return datetime.date.fromisoformat(date[:10]).toordinal() if date else 0
+
+
+def append_reviews(reviews: list[dict], path: str):
+    """
+    Appends new reviews to the review log (one json per line).
+
+    Args:
+        reviews (list[dict]): The {"url", "rating", "date"} reviews
+
+        path (str): The path of the log
+    """
+
+    with open(path, "a", encoding="utf-8") as file:
+        for review in reviews:
+            file.write(json.dumps(review, ensure_ascii=False) + "\n")
+
+
+class ReviewStats:
+    """
+    The running aggregates of the reviews of each product (number,
+    sum, last rating, date of the most recent one and time-decayed
+    mean), stored in arrays with one slot per URL. Adding a review
+    costs O(1), whatever the number of reviews already received.
+    """
+
+    def __init__(self, half_life_days: float = HALF_LIFE_DAYS, capacity: int = 1024):
+        self.half_life_days = half_life_days
+
+        # Position in the review log of the first review not read
+        self.log_offset = 0
+
+        self.urls = []
+        self.slots = {}
+        self._arrays = {
+            name: np.zeros(capacity, dtype=dtype) for name, dtype in FIELDS.items()
+        }
+
+    def __len__(self) -> int:
+        return len(self.urls)
+
+    def get_slot(self, url: str) -> int:
+        """
+        Gives the slot of a URL, created if needed.
+
+        Args:
+            url (str): The URL of the product
+
+        Returns:
+            int: The slot
+        """
+
+        slot = self.slots.get(url)
+
+        if slot is None:
+            slot = len(self.urls)
+
+            # The arrays double when they are full
+            capacity = len(self._arrays["count"])
+            if slot == capacity:
+                for name, values in self._arrays.items():
+                    self._arrays[name] = np.concatenate(
+                        [values, np.zeros(capacity, dtype=values.dtype)]
+                    )
+
+            self.slots[url] = slot
+            self.urls.append(url)
+
+        return slot
+
+    def add(self, url: str, rating: float, date: str = None) -> int:
+        """
+        Adds a review to the aggregates of its product.
+
+        Args:
+            url (str): The URL of the product
+
+            rating (float): The rating
+
+            date (str): The ISO date of the review
+
+        Returns:
+            int: The slot of the product
+        """
+
+        slot = self.get_slot(url)
+        arrays = self._arrays
+        ordinal = to_ordinal(date)
+
+        arrays["count"][slot] += 1
+        arrays["sum"][slot] += rating
+        arrays["last"][slot] = rating
+        arrays["last_date"][slot] = max(arrays["last_date"][slot], ordinal)
+
+        # The decayed sums are kept at the date of the most recent
+        # review, older ones are discounted from that date (reviews
+        # without date are not discounted)
+        decayed_date = arrays["decayed_date"][slot]
+        if ordinal and ordinal > decayed_date:
+            factor = self.get_decay(ordinal - decayed_date) if decayed_date else 1
+            arrays["decayed_sum"][slot] *= factor
+            arrays["decayed_weight"][slot] *= factor
+            arrays["decayed_date"][slot] = ordinal
+            weight = 1
+        elif ordinal:
+            weight = self.get_decay(decayed_date - ordinal)
+        else:
+            weight = 1
+
+        arrays["decayed_sum"][slot] += weight * rating
+        arrays["decayed_weight"][slot] += weight
+
+        return slot
+
+    def get_decay(self, days: int) -> float:
+        return math.pow(0.5, days / self.half_life_days)
+
+    def update_from_log(self, path: str) -> set[str]:
+        """
+        Adds the reviews appended to the review log since the last
+        call (only the complete lines are read).
+
+        Args:
+            path (str): The path of the log
+
+        Returns:
+            set[str]: The URLs whose aggregates changed
+        """
+
+        updated = set()
+
+        with open(path, "rb") as file:
+            file.seek(self.log_offset)
+
+            for line in file:
+                if not line.endswith(b"\n"):
+                    # Being written: read on the next call
+                    break
+
+                self.log_offset += len(line)
+                if not line.strip():
+                    continue
+
+                review = json.loads(line)
+                self.add(review["url"], review["rating"], review.get("date"))
+                updated.add(review["url"])
+
+        return updated
+
+    def get_arrays(self, slots: np.ndarray = None) -> dict:
+        """
+        Gives the aggregates of some slots.
+
+        Args:
+            slots (np.ndarray): The slots (all of them by default),
+                -1 for a product without slot (null aggregates)
+
+        Returns:
+            dict: The array of each field of FIELDS
+        """
+
+        if slots is None:
+            return {
+                name: values[:len(self.urls)]
+                for name, values in self._arrays.items()
+            }
+
+        slots = np.asarray(slots, dtype=np.int64)
+        missing = slots < 0
+
+        arrays = {}
+        for name, values in self._arrays.items():
+            arrays[name] = values[np.where(missing, 0, slots)]
+            arrays[name][missing] = 0
+
+        return arrays
+
+    def get(self, url: str) -> dict:
+        """
+        Gives the aggregates of a product, with the field names of
+        the reviews index of TP2.
+
+        Args:
+            url (str): The URL of the product
+
+        Returns:
+            dict: {
+                "total_reviews": int,
+                "average_rating": float,
+                "last_rating": float,
+                "last_review_date": str,
+                "decayed_rating": float
+            }
+        """
+
+        slot = self.slots[url]
+        arrays = self._arrays
+        count = int(arrays["count"][slot])
+
+        if count == 0:
+            return {
+                "total_reviews": 0,
+                "average_rating": 0,
+                "last_rating": None,
+                "last_review_date": None,
+                "decayed_rating": 0
+            }
+
+        last_date = int(arrays["last_date"][slot])
+
+        # The ratings are usually integers, and kept as such
+        last = float(arrays["last"][slot])
+        if last.is_integer():
+            last = int(last)
+
+        return {
+            "total_reviews": count,
+            "average_rating": float(arrays["sum"][slot]) / count,
+            "last_rating": last,
+            "last_review_date": (
+                datetime.date.fromordinal(last_date).isoformat()
+                if last_date else None
+            ),
+            "decayed_rating": float(
+                arrays["decayed_sum"][slot] / arrays["decayed_weight"][slot]
+            ),
+        }
+
+    def to_index(self) -> dict:
+        """
+        Gives the reviews index of TP2 (without the decayed rating).
+
+        Returns:
+            dict: The aggregates of each URL
+        """
+
+        index = {}
+
+        for url in self.urls:
+            index[url] = self.get(url)
+            del index[url]["decayed_rating"]
+
+        return index
+
+    @classmethod
+    def from_index(
+        cls,
+        reviews_index: dict,
+        half_life_days: float = HALF_LIFE_DAYS
+    ) -> "ReviewStats":
+        """
+        Creates the aggregates from a reviews index, written either by
+        TP2 ("average_rating", "last_rating" None without review) or as
+        in TP3/input ("mean_mark", "last_rating" 0 without review). The
+        reviews are not known one by one, so the decayed mean starts
+        as the mean.
+
+        Args:
+            reviews_index (dict): The index of the reviews
+
+            half_life_days (float): See HALF_LIFE_DAYS
+
+        Returns:
+            ReviewStats: The aggregates
+        """
+
+        stats = cls(half_life_days=half_life_days, capacity=max(1, len(reviews_index)))
+        arrays = stats._arrays
+
+        for url, review in reviews_index.items():
+            slot = stats.get_slot(url)
+            count = review.get("total_reviews") or 0
+            mean = review.get("average_rating", review.get("mean_mark")) or 0
+            last_date = to_ordinal(review.get("last_review_date"))
+
+            arrays["count"][slot] = count
+            arrays["sum"][slot] = mean * count
+            arrays["last"][slot] = review.get("last_rating") or 0
+            arrays["last_date"][slot] = last_date
+            arrays["decayed_sum"][slot] = mean * count
+            arrays["decayed_weight"][slot] = count
+            arrays["decayed_date"][slot] = last_date
+
+        return stats
+
+    def save(self, path: str):
+        """
+        Saves the aggregates in a npz file, with the position reached
+        in the review log.
+
+        Args:
+            path (str): The path of the file
+        """
+
+        np.savez(
+            path,
+            urls=np.array(self.urls, dtype=str),
+            log_offset=self.log_offset,
+            half_life_days=self.half_life_days,
+            **self.get_arrays()
+        )
+
+    @classmethod
+    def load(cls, path: str) -> "ReviewStats":
+        """
+        Loads aggregates saved with save.
+
+        Args:
+            path (str): The path of the file
+
+        Returns:
+            ReviewStats: The aggregates
+        """
+
+        with np.load(path) as data:
+            urls = data["urls"].tolist()
+            stats = cls(
+                half_life_days=float(data["half_life_days"]),
+                capacity=max(1, len(urls))
+            )
+            stats.log_offset = int(data["log_offset"])
+            stats.urls = urls
+            stats.slots = {url: slot for slot, url in enumerate(urls)}
+
+            for name in FIELDS:
+                stats._arrays[name][:len(urls)] = data[name]
+
+        return stats
@@ -0,0 +1,424 @@
+import hashlib
+import json
+import struct
+from array import array
+
+
+# Layout of the file (little endian):
+#   header: magic, version, number of terms, block size, number of
+#       blocks, length of the field names, fingerprint of the terms of
+#       each field (see get_fingerprint)
+#   field names (json list)
+#   block offsets (u32), fields of each term (u8 bit mask)
+#   blocks: for each term, the length of the prefix shared with the
+#       previous term of the block and the length of the rest
+#       (varints), then the rest (utf-8); the first term of a block
+#       is stored whole
+MAGIC = b"TDIC"
+VERSION = 2
+HEADER = struct.Struct("<4sIIIII16s")
+
+# The files written before the fingerprint was added are still read,
+# but never match the indexes (see TermDictionary.matches)
+HEADER_V1 = struct.Struct("<4sIIIII")
+
+# Number of IDs remembered by get_id (the words of a query are looked up
+# for every document scored)
+CACHE_SIZE = 4096
+
+# Value of get_id for a term which is not in the cache
+_MISSING = object()
+
+
+def encode_varint(value: int) -> bytes:
+    encoded = bytearray()
+
+    while value >= 0x80:
+        encoded.append((value & 0x7F) | 0x80)
+        value >>= 7
+    encoded.append(value)
+
+    return bytes(encoded)
+
+
+def decode_varint(buffer, position: int) -> tuple[int, int]:
+    value = 0
+    shift = 0
+
+    while True:
+        byte = buffer[position]
+        position += 1
+        value |= (byte & 0x7F) << shift
+        if byte < 0x80:
+            return value, position
+        shift += 7
+
+
+def get_shared_prefix_length(first: bytes, second: bytes) -> int:
+    length = 0
+
+    for a, b in zip(first, second):
+        if a != b:
+            break
+        length += 1
+
+    return length
+
+
+def get_term_masks(fields: dict, field_names: list) -> dict:
+    """
+    Gives the fields of each term, as a bit mask (bit i for the field
+    field_names[i]).
+    """
+
+    masks = {}
+    for bit, name in enumerate(field_names):
+        for term in fields[name]:
+            masks[term] = masks.get(term, 0) | (1 << bit)
+
+    return masks
+
+
+def get_fingerprint(fields: dict, field_names: list) -> bytes:
+    """
+    Gives a hash of the terms of each field, which tells if a
+    dictionary was created from some indexes without decoding it.
+
+    Args:
+        fields (dict): The terms of each field
+
+        field_names (list): The order of the fields
+
+    Returns:
+        bytes: The fingerprint (16 bytes)
+    """
+
+    fingerprint = hashlib.blake2b(digest_size=16)
+
+    for name in field_names:
+        terms = sorted(fields[name])
+        fingerprint.update(json.dumps(name).encode("utf-8"))
+        fingerprint.update(struct.pack("<Q", len(terms)))
+        fingerprint.update("\0".join(terms).encode("utf-8"))
+
+    return fingerprint.digest()
+
+
+def create_term_dictionary(fields: dict, block_size: int = 16) -> bytes:
+    """
+    Creates the dictionary of the terms of several fields: each
+    distinct term gets a single ID (its position in the sorted terms),
+    whatever the fields it appears in. The terms are front coded: in a
+    block, each term only stores what differs from the previous one.
+
+    Args:
+        fields (dict): The terms of each field (e.g. the keys of the
+            title, description, brand and origin indexes)
+
+        block_size (int): The number of terms of a block (the larger,
+            the smaller the file, but the slower a lookup)
+
+    Returns:
+        bytes: The content of the file
+    """
+
+    field_names = list(fields)
+    if len(field_names) > 8:
+        raise ValueError("A term dictionary holds at most 8 fields")
+
+    masks = get_term_masks(fields, field_names)
+    terms = sorted(masks, key=lambda term: term.encode("utf-8"))
+
+    offsets = []
+    blocks = bytearray()
+    previous = b""
+
+    for term_id, term in enumerate(terms):
+        encoded = term.encode("utf-8")
+
+        if term_id % block_size == 0:
+            offsets.append(len(blocks))
+            shared = 0
+        else:
+            shared = get_shared_prefix_length(previous, encoded)
+
+        rest = encoded[shared:]
+        if shared < 0x80 and len(rest) < 0x80:
+            # Most terms: both lengths fit in one byte
+            blocks.append(shared)
+            blocks.append(len(rest))
+        else:
+            blocks += encode_varint(shared)
+            blocks += encode_varint(len(rest))
+        blocks += rest
+        previous = encoded
+
+    offsets.append(len(blocks))
+
+    encoded_names = json.dumps(field_names).encode("utf-8")
+
+    return b"".join([
+        HEADER.pack(
+            MAGIC, VERSION, len(terms), block_size,
+            len(offsets) - 1, len(encoded_names),
+            get_fingerprint(fields, field_names)
+        ),
+        encoded_names,
+        struct.pack(f"<{len(offsets)}I", *offsets),
+        bytes(map(masks.__getitem__, terms)),
+        bytes(blocks),
+    ])
+
+
+def save_term_dictionary(content: bytes, path: str):
+    """
+    Saves a term dictionary in a binary file.
+
+    Args:
+        content (bytes): The dictionary
+
+        path (str): The path of the file
+    """
+
+    with open(path, "wb") as file:
+        file.write(content)
+
+
+def load_term_dictionary(path: str) -> "TermDictionary":
+    """
+    Loads a term dictionary from a binary file.
+
+    Args:
+        path (str): The path of the file
+
+    Returns:
+        TermDictionary: The dictionary
+    """
+
+    with open(path, "rb") as file:
+        return TermDictionary(file.read())
+
+
+class TermDictionary:
+    """
+    Gives the ID of a term, the term of an ID, the fields of a term
+    and the terms in a range, from the front-coded dictionary, which
+    is not decoded in memory.
+    """
+
+    def __init__(self, content: bytes):
+        magic, version = struct.unpack_from("<4sI", content, 0)
+        if magic != MAGIC or version not in (1, VERSION):
+            raise ValueError("Not a term dictionary")
+
+        header = HEADER if version == VERSION else HEADER_V1
+        _, _, self.n_terms, self.block_size, self.n_blocks, names_length, *rest = (
+            header.unpack_from(content, 0)
+        )
+        self.fingerprint = rest[0] if rest else None
+
+        position = header.size
+        self.fields = json.loads(content[position:position + names_length])
+        position += names_length
+
+        self._offsets = array("L", struct.unpack_from(
+            f"<{self.n_blocks + 1}I", content, position
+        ))
+        position += 4 * (self.n_blocks + 1)
+
+        self._masks = content[position:position + self.n_terms]
+        position += self.n_terms
+
+        self._blocks = content[position:]
+
+        self._bits = {name: 1 << bit for bit, name in enumerate(self.fields)}
+        self._cache = {}
+
+    def __len__(self) -> int:
+        return self.n_terms
+
+    def __contains__(self, term: str) -> bool:
+        return self.get_id(term) is not None
+
+    def _get_first_term(self, block: int) -> bytes:
+        position = self._offsets[block]
+        _, position = decode_varint(self._blocks, position)
+        length, position = decode_varint(self._blocks, position)
+
+        return self._blocks[position:position + length]
+
+    def _iter_block(self, block: int):
+        # Yields the (term ID, encoded term) pairs of a block
+        blocks = self._blocks
+        position = self._offsets[block]
+        end = self._offsets[block + 1]
+        term_id = block * self.block_size
+        term = b""
+
+        while position < end:
+            shared, position = decode_varint(blocks, position)
+            length, position = decode_varint(blocks, position)
+            term = term[:shared] + blocks[position:position + length]
+            position += length
+
+            yield term_id, term
+            term_id += 1
+
+    def _find_block(self, key: bytes) -> int:
+        # Last block whose first term is not greater than the key
+        low, high = 0, self.n_blocks
+        while low < high:
+            middle = (low + high) // 2
+            if self._get_first_term(middle) <= key:
+                low = middle + 1
+            else:
+                high = middle
+        return max(low - 1, 0)
+
+    def get_id(self, term: str) -> int | None:
+        """
+        Gives the ID of a term.
+
+        Args:
+            term (str): The term
+
+        Returns:
+            int | None: The ID, None if the term is unknown
+        """
+
+        # A single read: another query may clear the cache meanwhile
+        found = self._cache.get(term, _MISSING)
+        if found is not _MISSING:
+            return found
+
+        if not self.n_terms:
+            return None
+
+        key = term.encode("utf-8")
+        found = None
+
+        for term_id, encoded in self._iter_block(self._find_block(key)):
+            if encoded == key:
+                found = term_id
+                break
+            if encoded > key:
+                break
+
+        if len(self._cache) >= CACHE_SIZE:
+            self._cache.clear()
+        self._cache[term] = found
+
+        return found
+
+    def get_term(self, term_id: int) -> str:
+        """
+        Gives the term of an ID.
+
+        Args:
+            term_id (int): The ID
+
+        Returns:
+            str: The term
+        """
+
+        if not 0 <= term_id < self.n_terms:
+            raise IndexError(term_id)
+
+        for current_id, encoded in self._iter_block(term_id // self.block_size):
+            if current_id == term_id:
+                return encoded.decode("utf-8")
+
+    def get_fields(self, term_id: int) -> list[str]:
+        """
+        Gives the fields in which a term appears.
+
+        Args:
+            term_id (int): The ID of the term
+
+        Returns:
+            list[str]: The fields
+        """
+
+        mask = self._masks[term_id]
+
+        return [name for bit, name in enumerate(self.fields) if mask & (1 << bit)]
+
+    def has_field(self, term_id: int, field: str) -> bool:
+        """
+        Tells if a term appears in a field.
+
+        Args:
+            term_id (int): The ID of the term
+
+            field (str): The field
+
+        Returns:
+            bool
+        """
+
+        return bool(self._masks[term_id] & self._bits.get(field, 0))
+
+    def matches(self, fields: dict) -> bool:
+        """
+        Tells if the dictionary holds exactly the terms of some fields,
+        i.e. if it was created from these indexes and not from older
+        ones. The fingerprint saved in the file is compared, so the
+        dictionary is not decoded.
+
+        Args:
+            fields (dict): The terms of each field
+
+        Returns:
+            bool
+        """
+
+        if self.fingerprint is None or set(fields) != set(self.fields):
+            return False
+
+        return get_fingerprint(fields, self.fields) == self.fingerprint
+
+    def scan(self, start: str = "", stop: str = None):
+        """
+        Gives the terms from start (included) to stop (excluded), in
+        order.
+
+        Args:
+            start (str): The first term
+
+            stop (str): The end of the range (the last term by default)
+
+        Yields:
+            tuple[int, str]: The (term ID, term) pairs
+        """
+
+        if not self.n_terms:
+            return
+
+        key = start.encode("utf-8")
+        end = None if stop is None else stop.encode("utf-8")
+
+        for block in range(self._find_block(key), self.n_blocks):
+            for term_id, encoded in self._iter_block(block):
+                if encoded < key:
+                    continue
+                if end is not None and encoded >= end:
+                    return
+                yield term_id, encoded.decode("utf-8")
+
+    def prefix(self, prefix: str):
+        """
+        Gives the terms starting with a prefix, in order.
+
+        Args:
+            prefix (str): The prefix
+
+        Yields:
+            tuple[int, str]: The (term ID, term) pairs
+        """
+
+        key = prefix.encode("utf-8")
+
+        for term_id, term in self.scan(start=prefix):
+            if not term.encode("utf-8").startswith(key):
+                return
+            yield term_id, term